@@ -0,0 +1,202 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import Ingredient, IngredientInRecipe, Tag
+
+from .serializers import TagSerializer
+
+
+def get_version(name):
+    """
+    Current value of a shared version counter.
+    A counter missing from the cache starts from the current time,
+    so it never repeats a value handed out before.
+    """
+    return cache.get_or_set(f"version:{name}", time.time_ns(), None)
+
+
+def bump_version(name):
+    """Bumps a version counter once the current transaction commits."""
+
+    def bump():
+        try:
+            cache.incr(f"version:{name}")
+        except ValueError:
+            cache.set(f"version:{name}", time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+class VersionedCatalogue:
+    """
+    Process-local copy of a reference table.
+    It is loaded on first use and reloaded once the version counter
+    of the table has been bumped or max_age seconds have passed,
+    so reads cost no queries.
+    """
+
+    version_name = None
+    max_age = None
+
+    def __init__(self):
+        self.version = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def is_outdated(self, version):
+        if version != self.version:
+            return True
+        return (
+            self.max_age is not None
+            and time.time() - self.loaded_at > self.max_age
+        )
+
+    def get(self):
+        """Returns the catalogue, reloading it if it is outdated."""
+        version = get_version(self.version_name)
+        if self.is_outdated(version):
+            with self.lock:
+                if self.is_outdated(version):
+                    self.load()
+                    self.version = version
+                    self.loaded_at = time.time()
+        return self
+
+    def load(self):
+        raise NotImplementedError
+
+
+class TagCatalogue(VersionedCatalogue):
+    """
+    All tags with their slugs and the rendered tag list.
+    Reloaded every TAG_CATALOGUE_TTL seconds as well, for version bumps
+    that a process-local cache doesn't share between processes.
+    """
+
+    version_name = "tags"
+    max_age = settings.TAG_CATALOGUE_TTL
+
+    def load(self):
+        tags = list(Tag.objects.order_by("id"))
+        self.by_id = {tag.id: tag for tag in tags}
+        self.by_slug = {tag.slug: tag for tag in tags}
+        self.representation = TagSerializer(tags, many=True).data
+        # Same in every process serving the same tags.
+        self.content_version = hashlib.sha256(
+            json.dumps(self.representation).encode()
+        ).hexdigest()[:16]
+
+
+class IngredientCatalogue(VersionedCatalogue):
+    """
+    Ingredients with a sorted, case-folded name index for autocomplete.
+    Matches are ranked by the number of recipes using the ingredient.
+    The ranking is refreshed every INGREDIENT_RANKING_TTL seconds.
+    """
+
+    version_name = "ingredients"
+    max_age = settings.INGREDIENT_RANKING_TTL
+
+    def load(self):
+        uses = dict(
+            IngredientInRecipe.objects.values_list("ingredient").annotate(
+                Count("id")
+            )
+        )
+        rows = Ingredient.objects.values("id", "name", "measurement_unit")
+        by_id = {row["id"]: row for row in rows}
+        # Entries sort by name; rank_key orders matches by popularity.
+        index = sorted(
+            (row["name"].casefold(), -uses.get(row["id"], 0), row["id"])
+            for row in by_id.values()
+        )
+        self.by_id = by_id
+        self.index = index
+        self.names = [name for name, _, _ in index]
+        self.ranked = sorted(index, key=self.rank_key)
+        # Search results depend on the names and the ranking.
+        self.ranking_version = hashlib.sha256(
+            repr(index).encode()
+        ).hexdigest()[:16]
+        self.build_snapshot()
+
+    def build_snapshot(self):
+        """
+        Renders the whole catalogue as one compact [id, name, unit] array,
+        versioned by a hash of its content, plain and gzipped.
+        """
+        rows = json.dumps(
+            [
+                [row["id"], row["name"], row["measurement_unit"]]
+                for _, row in sorted(self.by_id.items())
+            ],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+        snapshot_version = hashlib.sha256(rows).hexdigest()[:16]
+        if snapshot_version == getattr(self, "snapshot_version", None):
+            return
+        self.snapshot = b'{"version":"%s","ingredients":%s}' % (
+            snapshot_version.encode(), rows
+        )
+        self.snapshot_gzip = gzip.compress(self.snapshot)
+        self.snapshot_version = snapshot_version
+        if settings.INGREDIENT_SNAPSHOT_DIR:
+            self.write_snapshot(settings.INGREDIENT_SNAPSHOT_DIR)
+
+    def write_snapshot(self, directory):
+        """
+        Writes ingredients.<version>.json and ingredients.json
+        for the web server to serve as static files.
+        Every process writes through its own temporary file,
+        and a version already written by another one is skipped.
+        """
+        os.makedirs(directory, exist_ok=True)
+        versioned = f"ingredients.{self.snapshot_version}.json"
+        if os.path.exists(os.path.join(directory, versioned)):
+            return
+        for name in (versioned, "ingredients.json"):
+            with tempfile.NamedTemporaryFile(
+                dir=directory, prefix=f".{name}.", delete=False
+            ) as file:
+                file.write(self.snapshot)
+            os.replace(file.name, os.path.join(directory, name))
+
+    @staticmethod
+    def rank_key(entry):
+        name, minus_uses, _ = entry
+        return minus_uses, name
+
+    def search(self, query, limit):
+        """
+        Returns up to limit ingredients whose names start with query,
+        followed by names containing it if there are too few of those.
+        """
+        query = query.strip().casefold()
+        if not query:
+            matches = self.ranked[:limit]
+        else:
+            start = bisect_left(self.names, query)
+            end = bisect_left(self.names, query + "\U0010ffff", start)
+            matches = sorted(self.index[start:end], key=self.rank_key)[:limit]
+        if len(matches) < limit:
+            matches += [
+                entry for entry in self.ranked
+                if query in entry[0] and not entry[0].startswith(query)
+            ][:limit - len(matches)]
+        return [self.by_id[entry[2]] for entry in matches]
+
+
+tag_catalogue = TagCatalogue()
+ingredient_catalogue = IngredientCatalogue()
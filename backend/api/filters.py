@@ -1,14 +1,27 @@
+from django.db.models import Exists, OuterRef
 from django_filters import FilterSet
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from .catalogue import tag_catalogue
+
+
+def tag_choices():
+    """Tag slugs from the in-process tag catalogue."""
+    return [
+        (slug, tag.name) for slug, tag in tag_catalogue.get().by_slug.items()
+    ]
 
 
 class RecipeFilter(FilterSet):
-    author = filters.CharFilter(
-        field_name="author__id", lookup_expr="icontains"
-    )
+    """
+    Filters recipes without joining to-many relations:
+    tags, favorites and the shopping cart are EXISTS semi-joins,
+    so every recipe matches at most once and no DISTINCT is needed.
+    """
+
+    author = filters.NumberFilter(field_name="author_id")
     is_favorited = filters.BooleanFilter(
         field_name="is_favorited",
         method="get_is_favorit",
@@ -16,26 +29,47 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="get_is_in_shopping_cart"
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method="get_tags",
     )
 
+    def get_tags(self, queryset, name, value):
+        """Slugs are resolved to ids by the in-process tag catalogue."""
+        by_slug = tag_catalogue.get().by_slug
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"),
+                    tag_id__in=[
+                        by_slug[slug].id for slug in value if slug in by_slug
+                    ],
+                )
+            )
+        )
+
     def get_is_favorit(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorit_recipe__user=self.request.user)
+            return queryset.filter(
+                Exists(
+                    Favorite.objects.filter(
+                        user=self.request.user, recipe=OuterRef("pk")
+                    )
+                )
+            )
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(
+                Exists(
+                    ShoppingCart.objects.filter(
+                        user=self.request.user, recipe=OuterRef("pk")
+                    )
+                )
+            )
         return queryset
 
     class Meta:
         model = Recipe
         fields = ["author", "tags", "is_favorited", "is_in_shopping_cart"]
-
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
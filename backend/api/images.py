@@ -0,0 +1,151 @@
+import base64
+import binascii
+import io
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError, features
+from rest_framework.serializers import ValidationError
+
+from recipes.models import Recipe
+from recipes.storage import image_storage
+
+from .jobs import enqueue, register, set_progress
+from .models import Job
+
+# Base64 is decoded in chunks of this many characters, a multiple of 4.
+CHUNK_SIZE = 64 * 1024
+
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+
+def decode_base64_image(data):
+    """
+    Decodes a data:image/...;base64 URI chunk by chunk
+    into a spooled temporary file.
+    The size is checked before decoding and the format and dimensions
+    from the image header, before any pixels are decoded.
+    """
+    marker = data.find(";base64,")
+    if marker == -1:
+        raise ValidationError("Images must be base64 encoded data URIs.")
+    start = marker + len(";base64,")
+    if (len(data) - start) // 4 * 3 > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValidationError(
+            f"Images must not be larger than "
+            f"{settings.RECIPE_IMAGE_MAX_SIZE} bytes."
+        )
+    file = SpooledTemporaryFile(max_size=settings.RECIPE_IMAGE_SPOOL_SIZE)
+    try:
+        for position in range(start, len(data), CHUNK_SIZE):
+            file.write(base64.b64decode(
+                data[position:position + CHUNK_SIZE], validate=True
+            ))
+    except binascii.Error:
+        file.close()
+        raise ValidationError("Invalid base64 image data.")
+    size = file.tell()
+    file.seek(0)
+    try:
+        image_format = read_header(file)
+    except ValidationError:
+        file.close()
+        raise
+    file.seek(0)
+    return UploadedFile(
+        file,
+        name=f"image.{EXTENSIONS[image_format]}",
+        content_type=Image.MIME[image_format],
+        size=size,
+    )
+
+
+def read_header(file):
+    """
+    Returns the format of an image from its header,
+    rejecting formats that are not allowed and oversized images.
+    """
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValidationError("Upload a valid image.")
+    if image_format not in settings.RECIPE_IMAGE_FORMATS:
+        raise ValidationError(
+            f"Allowed image formats: "
+            f"{', '.join(settings.RECIPE_IMAGE_FORMATS)}."
+        )
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f"Images must not have more than "
+            f"{settings.RECIPE_IMAGE_MAX_PIXELS} pixels."
+        )
+    return image_format
+
+
+def variants_outdated(recipe):
+    """Whether the image variants of the recipe belong to another image."""
+    return recipe.image_variants.get("source") != (recipe.image.name or None)
+
+
+def enqueue_variants(recipe):
+    """Queues generation of the image variants, once per image."""
+    pending = Job.objects.filter(
+        kind="image_variants",
+        status__in=(Job.QUEUED, Job.RUNNING),
+        payload__recipe_id=recipe.pk,
+        payload__image=recipe.image.name,
+    )
+    if not pending.exists():
+        enqueue("image_variants", recipe_id=recipe.pk, image=recipe.image.name)
+
+
+def variant_formats(image):
+    """
+    (extension, Pillow format, variant suffix) of the files to write:
+    JPEG, or PNG for images with transparency, and WebP if available.
+    """
+    transparent = image.mode in ("RGBA", "LA", "PA") or (
+        "transparency" in image.info
+    )
+    formats = [("png", "PNG", "") if transparent else ("jpg", "JPEG", "")]
+    if features.check("webp"):
+        formats.append(("webp", "WEBP", "_webp"))
+    return formats
+
+
+@register("image_variants")
+def generate_variants(job):
+    """
+    Writes resized copies of a recipe image for every size in
+    RECIPE_IMAGE_VARIANTS. Results for an image that has been
+    replaced in the meantime are dropped.
+    """
+    recipe = Recipe.objects.filter(
+        pk=job.payload["recipe_id"], image=job.payload["image"]
+    ).first()
+    if recipe is None:
+        return
+    variants = {"source": recipe.image.name}
+    with recipe.image.open("rb") as file, Image.open(file) as image:
+        formats = variant_formats(image)
+        image = image.convert("RGBA" if formats[0][1] == "PNG" else "RGB")
+        sizes = settings.RECIPE_IMAGE_VARIANTS.items()
+        for done, (name, size) in enumerate(sizes, start=1):
+            variant = image.copy()
+            variant.thumbnail(size)
+            for extension, image_format, suffix in formats:
+                content = io.BytesIO()
+                variant.save(content, image_format, optimize=True)
+                variants[name + suffix] = image_storage.save(
+                    f"recipes/variants/{name}.{extension}",
+                    ContentFile(content.getvalue()),
+                )
+            set_progress(job, 100 * done // len(sizes))
+    # Variants are part of the representation, so updated_at moves too.
+    Recipe.objects.filter(pk=recipe.pk, image=recipe.image.name).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
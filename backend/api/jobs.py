@@ -0,0 +1,91 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job kinds and the functions that run them, filled by register.
+HANDLERS = {}
+
+
+def register(kind):
+    """Registers the decorated function as the handler of a job kind."""
+
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+
+    return decorator
+
+
+def enqueue(kind, user=None, **payload):
+    """Queues a job; workers pick it up once the transaction commits."""
+    return Job.objects.create(kind=kind, user=user, payload=payload)
+
+
+def set_progress(job, progress):
+    """Records the progress, which is also a heartbeat of the job."""
+    job.progress = progress
+    job.heartbeat_at = timezone.now()
+    Job.objects.filter(pk=job.pk).update(
+        progress=progress, heartbeat_at=job.heartbeat_at
+    )
+
+
+def recover_stale_jobs():
+    """
+    Running jobs without a heartbeat for JOB_HEARTBEAT_TIMEOUT seconds
+    belong to a worker that died. They are queued again, or failed
+    once they have been tried JOB_MAX_ATTEMPTS times.
+    """
+    now = timezone.now()
+    deadline = now - timedelta(seconds=settings.JOB_HEARTBEAT_TIMEOUT)
+    stale = Job.objects.filter(status=Job.RUNNING).filter(
+        Q(heartbeat_at__lt=deadline) | Q(heartbeat_at__isnull=True)
+    )
+    stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error="The worker stopped", finished_at=now
+    )
+    stale.update(status=Job.QUEUED)
+
+
+@transaction.atomic
+def claim_job():
+    """
+    Marks the oldest queued job as running and returns it.
+    Rows locked by other workers are skipped.
+    """
+    recover_stale_jobs()
+    job = (
+        Job.objects.select_for_update(skip_locked=True)
+        .filter(status=Job.QUEUED)
+        .order_by("id")
+        .first()
+    )
+    if job is not None:
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=["status", "attempts", "heartbeat_at"])
+    return job
+
+
+def run_job(job):
+    """Runs a claimed job and records its outcome."""
+    try:
+        HANDLERS[job.kind](job)
+    except Exception as error:
+        logger.exception("Job %s failed", job.pk)
+        job.status = Job.FAILED
+        job.error = str(error) or error.__class__.__name__
+    else:
+        job.status = Job.DONE
+        job.progress = 100
+    job.finished_at = timezone.now()
+    job.save()
@@ -0,0 +1,151 @@
+import json
+import re
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.catalogue import tag_catalogue
+from api.filters import RecipeFilter
+from api.pagination import RecipeCursorPagination
+from recipes.models import IngredientInRecipe, Recipe, ShoppingListItem
+from users.models import User
+from users.relations import UserRelations
+
+PAGE_SIZE = 6
+SAMPLE_IDS = list(range(1, PAGE_SIZE + 1))
+
+
+def filtered_recipes(user, **params):
+    """Recipes filtered by RecipeFilter the way the recipe list does it."""
+    return RecipeFilter(
+        params,
+        queryset=Recipe.objects.all(),
+        request=SimpleNamespace(user=user),
+    ).qs
+
+
+def hot_queries(user):
+    """
+    The queries behind the busiest endpoints,
+    built by the same code the views use.
+    """
+    recipes = Recipe.objects.select_related("author").with_user_flags(user)
+    paginator = RecipeCursorPagination()
+    yield "recipe page", recipes.order_by(
+        *paginator.ordering
+    )[:PAGE_SIZE]
+    yield "recipe cursor page", paginator.seek(
+        recipes, (timezone.now(), SAMPLE_IDS[-1])
+    )[:PAGE_SIZE]
+    yield "recipes by author", filtered_recipes(
+        user, author=user.pk
+    ).order_by(*paginator.ordering)[:PAGE_SIZE]
+    yield "favorite recipes", filtered_recipes(
+        user, is_favorited=True
+    ).order_by(*paginator.ordering)[:PAGE_SIZE]
+    yield "recipes in shopping cart", filtered_recipes(
+        user, is_in_shopping_cart=True
+    ).order_by(*paginator.ordering)[:PAGE_SIZE]
+    slugs = list(tag_catalogue.get().by_slug)[:2]
+    if slugs:
+        yield "recipes by tags", filtered_recipes(
+            user, tags=slugs
+        ).order_by(*paginator.ordering)[:PAGE_SIZE]
+    yield "recipe tags", Recipe.tags.through.objects.filter(
+        recipe_id__in=SAMPLE_IDS
+    ).select_related("tag")
+    yield "recipe ingredients", IngredientInRecipe.objects.filter(
+        recipe_id__in=SAMPLE_IDS
+    ).select_related("ingredient")
+    relations = UserRelations(user)
+    yield "favorite flags", relations.favorites.queryset.filter(
+        recipe_id__in=SAMPLE_IDS
+    )
+    yield "shopping cart flags", relations.shopping_cart.queryset.filter(
+        recipe_id__in=SAMPLE_IDS
+    )
+    yield "follow flags", relations.following.queryset.filter(
+        following_id__in=SAMPLE_IDS
+    )
+    yield "subscriptions", User.objects.filter(
+        following__user=user
+    )[:PAGE_SIZE]
+    yield "shopping list", ShoppingListItem.objects.shopping_list(user)
+
+
+def postgresql_seq_scans(sql, params, threshold):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get("Plans", ()))
+        if node["Node Type"] == "Seq Scan" and node["Plan Rows"] > threshold:
+            yield f"{node['Relation Name']} (~{node['Plan Rows']} rows)"
+
+
+def sqlite_seq_scans(sql, params, threshold):
+    # SQLite plans carry no row estimates, so every full scan is reported,
+    # except walking an index in order under a LIMIT.
+    limited = " LIMIT " in sql
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[-1] for row in cursor.fetchall()]
+    for detail in details:
+        match = re.match(r"SCAN (?:TABLE )?(\S+)( USING .*INDEX)?", detail)
+        if match and not (limited and match.group(2)):
+            yield match.group(1)
+
+
+EXPLAINERS = {
+    "postgresql": postgresql_seq_scans,
+    "sqlite": sqlite_seq_scans,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the hot queries of the API and fails "
+        "on sequential scans of large tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=int,
+            default=1000,
+            help="Estimated rows above which a sequential scan fails.",
+        )
+        parser.add_argument(
+            "--user", type=int, help="Id of the user to build queries for."
+        )
+
+    def handle(self, *args, **options):
+        explainer = EXPLAINERS.get(connection.vendor)
+        if explainer is None:
+            raise CommandError(f"{connection.vendor} is not supported.")
+        if options["user"] is not None:
+            user = User.objects.get(pk=options["user"])
+        else:
+            user = User.objects.order_by("pk").first() or User(pk=0)
+
+        failures = 0
+        for name, queryset in hot_queries(user):
+            sql, params = queryset.query.sql_with_params()
+            scans = list(explainer(sql, params, options["threshold"]))
+            if scans:
+                failures += 1
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{name}: sequential scan of {', '.join(scans)}"
+                    )
+                )
+            else:
+                self.stdout.write(f"{name}: ok")
+        if failures:
+            raise CommandError(f"{failures} queries scan whole tables.")
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(settings.WORKER_POLL_INTERVAL)
+                continue
+            run_job(job)
+            self.stdout.write(str(job))
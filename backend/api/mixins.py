@@ -0,0 +1,73 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Builds an entity tag from the parts that define a response body."""
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Answers list and retrieve requests with 304 Not Modified
+    when the validators of the view match the request,
+    before anything is serialized.
+    Views define get_list_validators and get_detail_validators,
+    returning the parts of the entity tag and the last modification
+    time (or None).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_validators(), super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_detail_validators(),
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def get_list_validators(self):
+        return None, None
+
+    def get_detail_validators(self):
+        return None, None
+
+    def conditional_response(self, validators, handler, request, *args,
+                             **kwargs):
+        etag_parts, last_modified = validators
+        etag = None
+        if etag_parts is not None:
+            etag = make_etag(
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                request.user.pk,
+                etag_parts,
+            )
+        # Per-user flags change without touching recipes,
+        # so only anonymous responses can be validated by date.
+        if request.user.is_authenticated:
+            last_modified = None
+        timestamp = last_modified and int(last_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if etag is not None:
+            response["ETag"] = etag
+        if timestamp:
+            response["Last-Modified"] = http_date(timestamp)
+        patch_vary_headers(response, ("Accept", "Authorization"))
+        patch_cache_control(response, no_cache=True)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        return response
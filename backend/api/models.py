@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    Background job, queued in the database and run by
+    the run_worker management command.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    kind = models.CharField("Kind", max_length=50)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="User",
+        on_delete=models.CASCADE,
+        related_name="jobs",
+        null=True,
+        blank=True,
+    )
+    payload = models.JSONField("Payload", default=dict)
+    status = models.CharField(
+        "Status", max_length=10, choices=STATUSES, default=QUEUED
+    )
+    progress = models.PositiveSmallIntegerField("Progress, %", default=0)
+    result = models.FileField("Result", upload_to="jobs/", blank=True)
+    error = models.TextField("Error", blank=True)
+    attempts = models.PositiveSmallIntegerField("Attempts", default=0)
+    created_at = models.DateTimeField("Created", auto_now_add=True)
+    heartbeat_at = models.DateTimeField(
+        "Last sign of life of the worker", null=True, blank=True
+    )
+    finished_at = models.DateTimeField("Finished", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ("id",)
+        indexes = (
+            models.Index(fields=["status", "id"], name="job_status_id_idx"),
+        )
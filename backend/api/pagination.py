@@ -0,0 +1,99 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipeCursorPagination(BasePagination):
+    """
+    Keyset pagination of recipes, newest first.
+    Each page continues after the (pub_date, id) of the last recipe
+    of the previous one, so no OFFSET or COUNT is needed at any depth.
+    The first page is requested with an empty cursor parameter.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    ordering = ("-pub_date", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        results = list(self.window(queryset, request))
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def window(self, queryset, request):
+        """
+        The recipes of the requested page,
+        plus one telling whether there is a next page.
+        """
+        position = self.decode_cursor(request)
+        return self.seek(queryset, position)[:self.get_page_size(request) + 1]
+
+    def seek(self, queryset, position):
+        """Orders the queryset and skips everything up to the position."""
+        queryset = queryset.order_by(*self.ordering)
+        if position is None:
+            return queryset
+        pub_date, pk = position
+        return queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+        )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Returns the (pub_date, id) position encoded in the cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode("ascii"))
+            pub_date, pk = decoded.decode("ascii").split("|")
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe):
+        """Packs the position of the recipe into an opaque cursor."""
+        position = f"{recipe.pub_date.isoformat()}|{recipe.pk}"
+        encoded = base64.urlsafe_b64encode(position.encode("ascii"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
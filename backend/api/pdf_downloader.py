@@ -1,41 +1,139 @@
+import functools
+import hashlib
 import io
+import json
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from .jobs import enqueue, register, set_progress
+from .models import Job
 
-def create_pdf_file(shopping_cart):
+FONT_NAME = "Helvetica"
+
+
+@functools.lru_cache(maxsize=None)
+def register_fonts():
+    """Parses and registers the font once per process."""
     pdfmetrics.registerFont(TTFont(
-        "Helvetica", settings.FONTS_FILES_DIR, "UTF-8"
+        FONT_NAME, settings.FONTS_FILES_DIR, "UTF-8"
     ))
+
+
+def shopping_list_row(ingredient):
+    """Turns an aggregated shopping list entry into a (name, unit, amount)."""
+    return (
+        ingredient["ingredient__name"],
+        ingredient["ingredient__measurement_unit"],
+        ingredient["ingredient_amount_sum"],
+    )
+
+
+def shopping_list_rows(shopping_cart):
+    return [shopping_list_row(ingredient) for ingredient in shopping_cart]
+
+
+def rows_digest(rows):
+    """Hash of the shopping list content, the PDF is a function of it."""
+    return hashlib.sha256(
+        json.dumps(rows, ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+
+
+def render_pdf(rows, progress=None):
+    """
+    Renders the shopping list, reporting the percentage done
+    to progress after every page.
+    The document is invariant: the same rows give the same bytes.
+    """
+    register_fonts()
     buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter, bottomup=0)
+    pdf = canvas.Canvas(buffer, pagesize=letter, bottomup=0, invariant=1)
     pdf.translate(cm, cm)
-    pdf.setFont("Helvetica", 22)
+    pdf.setFont(FONT_NAME, 22)
     pdf.drawString(200, 5, "Shopping list:")
-    pdf.setFont("Helvetica", 16)
+    pdf.setFont(FONT_NAME, 16)
     down_param = 20
-    for number, ingredient in enumerate(shopping_cart, start=1):
-        pdf.drawString(
-            10,
-            down_param,
-            f"{number}. {ingredient['ingredient__name']}, "
-            f"{ingredient['ingredient_amount_sum']} "
-            f"{ingredient['ingredient__measurement_unit']}.",
-        )
+    for number, (name, unit, amount) in enumerate(rows, start=1):
+        pdf.drawString(10, down_param, f"{number}. {name}, {amount} {unit}.")
         down_param += 20
         if down_param >= 780:
             down_param = 20
             pdf.showPage()
-            pdf.setFont("Helvetica", 16)
+            pdf.setFont(FONT_NAME, 16)
+            if progress is not None:
+                progress(100 * number // len(rows))
     pdf.showPage()
     pdf.save()
-    buffer.seek(0)
-    return FileResponse(
-        buffer, as_attachment=True, filename="shopping_cart.pdf"
+    return buffer.getvalue()
+
+
+def get_pdf(rows, digest, progress=None):
+    """Returns the rendered shopping list, from the cache if possible."""
+    key = f"shopping-list-pdf:{digest}"
+    content = cache.get(key)
+    if content is None:
+        content = render_pdf(rows, progress)
+        cache.set(key, content, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return content
+
+
+def create_pdf_file(request, rows):
+    """
+    Responds with the shopping list PDF under a strong ETag
+    derived from its content, or 304 if the client has it already.
+    """
+    digest = rows_digest(rows)
+    etag = quote_etag(digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(
+            io.BytesIO(get_pdf(rows, digest)),
+            as_attachment=True,
+            filename="shopping_cart.pdf",
+            content_type="application/pdf",
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def enqueue_pdf_file(user, rows):
+    """
+    Queues rendering of the shopping list of the user.
+    A job for the same list that is pending or done is reused,
+    other finished jobs of the user are removed with their files.
+    """
+    digest = rows_digest(rows)
+    jobs = Job.objects.filter(kind="shopping_list", user=user)
+    existing = jobs.filter(
+        status__in=(Job.QUEUED, Job.RUNNING, Job.DONE),
+        payload__digest=digest,
+    ).first()
+    if existing is not None:
+        return existing
+    for job in jobs.filter(status__in=(Job.DONE, Job.FAILED)):
+        job.result.delete(save=False)
+        job.delete()
+    return enqueue("shopping_list", user=user, rows=rows, digest=digest)
+
+
+@register("shopping_list")
+def render_pdf_job(job):
+    rows = [tuple(row) for row in job.payload["rows"]]
+    digest = job.payload["digest"]
+    content = get_pdf(
+        rows, digest, progress=lambda done: set_progress(job, done)
+    )
+    job.result.save(
+        f"shopping_cart_{digest[:16]}.pdf", ContentFile(content), save=False
     )
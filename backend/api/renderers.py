@@ -0,0 +1,74 @@
+import csv
+import json
+
+from rest_framework import renderers
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """
+    Format of a shopping list download.
+    The list itself is streamed by the view from stream();
+    anything else, like errors and job statuses, is rendered as JSON.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = "application/json"
+        return renderers.JSONRenderer().render(
+            data, "application/json", renderer_context
+        )
+
+    def stream(self, rows):
+        """Yields the shopping list rows (name, unit, amount) as text."""
+        raise NotImplementedError
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+    def stream(self, rows):
+        yield "Shopping list:\n"
+        for number, (name, unit, amount) in enumerate(rows, start=1):
+            yield f"{number}. {name}, {amount} {unit}.\n"
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    class Line:
+        """File-like object handing back what csv.writer writes."""
+
+        def write(self, value):
+            return value
+
+    def stream(self, rows):
+        writer = csv.writer(self.Line())
+        yield writer.writerow(("name", "measurement_unit", "amount"))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class JSONRenderer(ShoppingListRenderer):
+    media_type = "application/json"
+    format = "json"
+
+    def stream(self, rows):
+        separator = "["
+        for name, unit, amount in rows:
+            yield separator + json.dumps(
+                {"name": name, "measurement_unit": unit, "amount": amount},
+                ensure_ascii=False,
+            )
+            separator = ","
+        yield "]" if separator == "," else "[]"
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def recipe_cache_key(recipe, request):
+    """
+    Key of the shared representation of a recipe.
+    It changes with every update of the recipe, so stale entries are
+    never read. The host is part of the key because image urls are
+    absolute.
+    """
+    host = request.get_host() if request is not None else ""
+    version = int(recipe.updated_at.timestamp() * 1_000_000)
+    return f"recipe:{recipe.pk}:{version}:{host}"
+
+
+def get_cached_recipes(recipes, request):
+    """Returns the cached representations of recipes by recipe id."""
+    keys = {recipe_cache_key(recipe, request): recipe.pk for recipe in recipes}
+    cached = cache.get_many(keys)
+    return {keys[key]: data for key, data in cached.items()}
+
+
+def cache_recipe(recipe, request, data):
+    """Stores the representation of a recipe."""
+    cache.set(
+        recipe_cache_key(recipe, request),
+        dict(data),
+        settings.RECIPE_CACHE_TIMEOUT,
+    )
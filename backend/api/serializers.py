@@ -1,25 +1,27 @@
-import base64
-
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from rest_framework.serializers import (ModelSerializer,
-                                        PrimaryKeyRelatedField,
-                                        ValidationError)
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework.serializers import ModelSerializer, ValidationError
+
+from recipes import shopping_list
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.relations import RelationsListSerializer, UserRelations
+from users.serializers import CustomUserSerializer, ImageVariantsField
 
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
-from users.serializers import CustomUserSerializer
+from .images import decode_base64_image
+from .models import Job
+from .representations import cache_recipe, get_cached_recipes
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
-
+            # decode_base64_image has validated the image already,
+            # so it is not opened again by ImageField.
+            return serializers.FileField.to_internal_value(
+                self, decode_base64_image(data)
+            )
         return super().to_internal_value(data)
 
 
@@ -59,9 +61,29 @@ class GetIngredientRecipeSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class RecipeListSerializer(RelationsListSerializer):
+    """
+    Takes the shared part of each recipe from the cache
+    and loads tags and ingredients only for the recipes missing there.
+    """
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, "all") else data)
+        cached = get_cached_recipes(recipes, self.context.get("request"))
+        for recipe in recipes:
+            recipe.cached_representation = cached.get(recipe.pk)
+        prefetch_related_objects(
+            [recipe for recipe in recipes if recipe.pk not in cached],
+            *Recipe.objects.related_lookups(),
+        )
+        return super().to_representation(recipes)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """
     Serializer for Recipe safe methods.
+    Everything except the per-user flags and the counters is the same
+    for all users and is cached per recipe version.
     """
 
     tags = TagSerializer(many=True, read_only=True)
@@ -71,6 +93,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -84,28 +107,119 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
+            "favorites_count",
+            "in_carts_count",
         )
+        list_serializer_class = RecipeListSerializer
+
+    def expect_relations(self, relations, recipes):
+        """
+        Registers the page recipes and their authors with the relations
+        of the request user. Annotated recipes are answered in place.
+        """
+        recipes = [
+            recipe for recipe in recipes
+            if not hasattr(recipe, "is_favorited")
+        ]
+        relations.favorites.expect(recipe.id for recipe in recipes)
+        relations.shopping_cart.expect(recipe.id for recipe in recipes)
+        relations.following.expect(recipe.author_id for recipe in recipes)
+
+    def to_representation(self, instance):
+        """
+        Serves the cached representation with fresh per-user flags
+        and counters, or serializes the recipe and caches it.
+        """
+        if hasattr(instance, "author_is_subscribed"):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        request = self.context.get("request")
+        if hasattr(instance, "cached_representation"):
+            data = instance.cached_representation
+        else:
+            data = get_cached_recipes([instance], request).get(instance.pk)
+        if data is None:
+            prefetch_related_objects(
+                [instance], *Recipe.objects.related_lookups()
+            )
+            data = super().to_representation(instance)
+            cache_recipe(instance, request, data)
+            return data
+        data["favorites_count"] = instance.favorites_count
+        data["in_carts_count"] = instance.in_carts_count
+        data["is_favorited"] = self.get_is_favorited(instance)
+        data["is_in_shopping_cart"] = self.get_is_in_shopping_cart(instance)
+        data["author"]["is_subscribed"] = self.fields[
+            "author"
+        ].get_is_subscribed(instance.author)
+        return data
 
     def get_is_favorited(self, object):
         """
         Returns a bool value when asked if there is a recipe in favorites.
         """
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.favorit_user.filter(recipe=object).exists()
+        if hasattr(object, "is_favorited"):
+            return object.is_favorited
+        relations = UserRelations.from_context(self.context)
+        return relations is not None and object.id in relations.favorites
 
     def get_is_in_shopping_cart(self, object):
         """
         Returns a bool value when asked
         if there is a recipe in the shopping list.
         """
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.shopping_cart.filter(recipe=object).exists()
+        if hasattr(object, "is_in_shopping_cart"):
+            return object.is_in_shopping_cart
+        relations = UserRelations.from_context(self.context)
+        return (
+            relations is not None and object.id in relations.shopping_cart
+        )
+
+
+def resolve_ids(queryset, ids):
+    """
+    Fetches the objects with the given ids with one IN query.
+    All ids that don't exist are reported in a single error.
+    """
+    objects = queryset.in_bulk(set(ids))
+    missing = sorted(set(ids) - objects.keys())
+    if missing:
+        raise ValidationError(
+            f"Invalid pk {', '.join(map(str, missing))} "
+            f"- object does not exist."
+        )
+    return [objects[pk] for pk in ids]
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """
+    Many-to-many primary key field resolving all submitted ids at once,
+    instead of with a query per id like PrimaryKeyRelatedField.
+    """
+
+    child = serializers.IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return resolve_ids(self.queryset, super().to_internal_value(data))
+
+
+class IngredientAmountListSerializer(serializers.ListSerializer):
+    """Resolves the ingredients of all amounts with one query."""
+
+    def to_internal_value(self, data):
+        amounts = super().to_internal_value(data)
+        ingredients = resolve_ids(
+            Ingredient.objects.all(), [amount["id"] for amount in amounts]
+        )
+        for amount, ingredient in zip(amounts, ingredients):
+            amount["id"] = ingredient
+        return amounts
 
 
 class CreateIngredientRecipeSerializer(ModelSerializer):
@@ -113,11 +227,12 @@ class CreateIngredientRecipeSerializer(ModelSerializer):
     To return summary information about ingredients when creating a recipe.
     """
 
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientInRecipe
         fields = ("id", "amount")
+        list_serializer_class = IngredientAmountListSerializer
 
 
 class CreateRecipeSerializer(ModelSerializer):
@@ -127,7 +242,7 @@ class CreateRecipeSerializer(ModelSerializer):
     """
 
     image = Base64ImageField(required=False, allow_null=True)
-    tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all())
     ingredients = CreateIngredientRecipeSerializer(many=True)
 
     def to_representation(self, value):
@@ -150,8 +265,12 @@ class CreateRecipeSerializer(ModelSerializer):
         return tags
 
     def add_ingredients(self, ingredients_data, recipe):
-        """Adds ingredients to recipes."""
-        IngredientInRecipe.objects.bulk_create(
+        """
+        Adds ingredients to recipes.
+        bulk_create sends no signals, so the shopping lists holding
+        the recipe are updated here.
+        """
+        amounts = IngredientInRecipe.objects.bulk_create(
             [
                 IngredientInRecipe(
                     ingredient=ingredient.get("id"),
@@ -161,7 +280,62 @@ class CreateRecipeSerializer(ModelSerializer):
                 for ingredient in ingredients_data
             ]
         )
+        shopping_list.propagate_amounts(
+            recipe.id,
+            {amount.ingredient_id: amount.amount for amount in amounts},
+        )
+
+    def update_tags(self, recipe, tags):
+        """Adds and removes only the tags that changed."""
+        current = set(recipe.tags.values_list("id", flat=True))
+        new = {tag.id for tag in tags}
+        if current - new:
+            recipe.tags.remove(*(current - new))
+        if new - current:
+            recipe.tags.add(*(new - current))
+
+    def update_ingredients(self, recipe, ingredients_data):
+        """
+        Deletes, updates and inserts only the ingredient amounts
+        that changed.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in recipe.ingredient_amounts.all()
+        }
+        new = {
+            ingredient["id"].id: ingredient for ingredient in ingredients_data
+        }
+        removed = current.keys() - new.keys()
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = [
+            amount
+            for ingredient_id, amount in current.items()
+            if ingredient_id in new
+            and amount.amount != new[ingredient_id]["amount"]
+        ]
+        deltas = {}
+        for amount in changed:
+            new_amount = new[amount.ingredient_id]["amount"]
+            deltas[amount.ingredient_id] = new_amount - amount.amount
+            amount.amount = new_amount
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ["amount"])
+            shopping_list.propagate_amounts(recipe.id, deltas)
+        # Inserted in the submitted order, which is the order they
+        # are listed in.
+        self.add_ingredients(
+            [
+                ingredient for ingredient in ingredients_data
+                if ingredient["id"].id not in current
+            ],
+            recipe,
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Custom 'create' method.
@@ -175,20 +349,20 @@ class CreateRecipeSerializer(ModelSerializer):
         self.add_ingredients(ingredients_data, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Custom 'update' method.
-        Created to load the author, tags and ingredients.
+        Tags and ingredients are diffed against the stored ones
+        and left alone when the request doesn't include them.
         """
-        recipe = instance
-        tags = validated_data.pop("tags")
-        ingredients = validated_data.pop("ingredients")
+        tags = validated_data.pop("tags", None)
+        ingredients = validated_data.pop("ingredients", None)
         super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
-        instance.tags.set(tags)
-        IngredientInRecipe.objects.filter(recipe=recipe).delete()
-        self.add_ingredients(ingredients, recipe)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
         return instance
 
     class Meta:
@@ -198,31 +372,21 @@ class CreateRecipeSerializer(ModelSerializer):
         )
 
 
-class FavoriteSerializer(ModelSerializer):
-    """Serializer for the Favorites model."""
+class JobSerializer(ModelSerializer):
+    """Status of a background job and the url of its result."""
+
+    file = serializers.FileField(source="result", read_only=True)
 
     class Meta:
-        model = Favorite
-        fields = "__all__"
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=("user", "recipe"),
-                message="You have already bookmarked this recipe.",
-            )
-        ]
+        model = Job
+        fields = ("id", "status", "progress", "file", "error")
 
 
-class ShoppingCartSerializer(ModelSerializer):
-    """Serializer for the ShoppingCart mode."""
+class RecipeIdsSerializer(serializers.Serializer):
+    """Recipe ids of a bulk favorite or shopping cart request."""
 
-    class Meta:
-        model = ShoppingCart
-        fields = "__all__"
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=("user", "recipe"),
-                message="You have already added this recipe to shopping list",
-            )
-        ]
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_RELATIONS_LIMIT,
+    )
@@ -0,0 +1,79 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.models import User
+
+from .catalogue import bump_version
+from .images import enqueue_variants, variants_outdated
+
+# User fields that are part of the recipe representation.
+AUTHOR_FIELDS = {"email", "username", "first_name", "last_name"}
+
+
+def touch_recipes(**lookups):
+    """
+    Moves updated_at of the matching recipes forward.
+    This bumps the version their cached representations are keyed by.
+    """
+    Recipe.objects.filter(**lookups).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def ingredient_amount_changed(sender, instance, **kwargs):
+    touch_recipes(pk=instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action in ("post_add", "post_remove"):
+        touch_recipes(pk__in=pk_set)
+    elif reverse and action == "pre_clear":
+        touch_recipes(tags=instance)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        touch_recipes(pk=instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    touch_recipes(tags=instance)
+    bump_version("tags")
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(ingredients=instance)
+    bump_version("ingredients")
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    bump_version("ingredients")
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    touch_recipes(author=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and "image" not in update_fields:
+        return
+    if not variants_outdated(instance):
+        return
+    if instance.image:
+        enqueue_variants(instance)
+    else:
+        Recipe.objects.filter(pk=instance.pk).update(
+            image_variants={}, updated_at=timezone.now()
+        )
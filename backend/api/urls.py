@@ -1,9 +1,11 @@
 from django.urls import include, path, re_path
 from rest_framework import routers
 
-from users.views import CustomTokenCreateView, UsersViewSet
+from users.views import (CustomTokenCreateView, CustomTokenDestroyView,
+                         TokenRefreshView, UsersViewSet)
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from .views import (DatabasePoolView, IngredientViewSet, RecipeViewSet,
+                    TagViewSet)
 
 
 v1_router = routers.DefaultRouter()
@@ -20,5 +22,16 @@ urlpatterns = [
     re_path(
         r"^auth/token/login/?$", CustomTokenCreateView.as_view(), name="login"
     ),
+    re_path(
+        r"^auth/token/logout/?$",
+        CustomTokenDestroyView.as_view(),
+        name="logout",
+    ),
+    re_path(
+        r"^auth/token/refresh/?$",
+        TokenRefreshView.as_view(),
+        name="token-refresh",
+    ),
     path("auth/", include("djoser.urls.authtoken")),
+    path("db-pool/", DatabasePoolView.as_view(), name="db-pool"),
 ]
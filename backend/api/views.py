@@ -1,47 +1,158 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+from foodgram.db.pool import pool_stats
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from users.relations import (add_relation, add_relations, relations_version,
+                             remove_relation, remove_relations)
 from users.serializers import ShortRecipeSerializer
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .pdf_downloader import create_pdf_file
+from .catalogue import ingredient_catalogue, tag_catalogue
+from .filters import RecipeFilter
+from .mixins import ConditionalGetMixin
+from .models import Job
+from .pagination import RecipeCursorPagination
+from .pdf_downloader import (create_pdf_file, enqueue_pdf_file,
+                             shopping_list_row, shopping_list_rows)
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, TagSerializer)
+from .renderers import (CSVRenderer, JSONRenderer, PDFRenderer,
+                        PlainTextRenderer)
+from .serializers import (CreateRecipeSerializer, IngredientSerializer,
+                          JobSerializer, RecipeIdsSerializer, RecipeSerializer,
+                          TagSerializer)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
-    """Viewset for Tag class objects."""
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
+    """
+    Viewset for Tag class objects.
+    Tags are served from the in-process tag catalogue.
+    """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def get_list_validators(self):
+        return (tag_catalogue.get().content_version,), None
 
-class IngredientViewSet(ReadOnlyModelViewSet):
-    """Viewset for Ingredient class objects."""
+    def get_detail_validators(self):
+        return self.get_list_validators()
+
+    def get_object(self):
+        try:
+            return tag_catalogue.get().by_id[int(self.kwargs["pk"])]
+        except (KeyError, ValueError):
+            raise Http404
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_validators(), self.list_catalogue, request
+        )
+
+    def list_catalogue(self, request):
+        """Returns the tag list rendered by the catalogue."""
+        return Response(tag_catalogue.get().representation)
+
+
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
+    """
+    Viewset for Ingredient class objects.
+    Ingredients are served and searched by name prefix
+    from the in-process ingredient catalogue.
+    """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [IngredientSearchFilter]
-    search_fields = ('^name',)
     permission_classes = (AllowAny,)
     pagination_class = None
+    search_param = "name"
+
+    def get_list_validators(self):
+        catalogue = ingredient_catalogue.get()
+        return (catalogue.snapshot_version, catalogue.ranking_version), None
 
+    def get_detail_validators(self):
+        return (ingredient_catalogue.get().snapshot_version,), None
 
-class RecipeViewSet(ModelViewSet):
+    def get_object(self):
+        try:
+            return ingredient_catalogue.get().by_id[int(self.kwargs["pk"])]
+        except (KeyError, ValueError):
+            raise Http404
+
+    def get_search_limit(self):
+        """The limit query parameter, capped by INGREDIENT_SEARCH_LIMIT."""
+        try:
+            limit = int(self.request.query_params["limit"])
+        except (KeyError, ValueError):
+            return settings.INGREDIENT_SEARCH_LIMIT
+        return max(1, min(limit, settings.INGREDIENT_SEARCH_LIMIT))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_validators(), self.search_catalogue, request
+        )
+
+    def search_catalogue(self, request):
+        """Returns the best matches for the name query parameter."""
+        return Response(
+            ingredient_catalogue.get().search(
+                request.query_params.get(self.search_param, ""),
+                self.get_search_limit(),
+            )
+        )
+
+    @action(detail=False, methods=["get"])
+    def snapshot(self, request):
+        """
+        The whole catalogue for client-side search.
+        Clients keep it until its version changes; a request naming
+        the current version may be cached for good.
+        """
+        catalogue = ingredient_catalogue.get()
+        etag = quote_etag(catalogue.snapshot_version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            gzipped = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+            response = HttpResponse(
+                catalogue.snapshot_gzip if gzipped else catalogue.snapshot,
+                content_type="application/json",
+            )
+            if gzipped:
+                response["Content-Encoding"] = "gzip"
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if request.query_params.get("version") == catalogue.snapshot_version:
+            patch_cache_control(
+                response, public=True, max_age=60 * 60 * 24 * 365,
+                immutable=True,
+            )
+        else:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.INGREDIENT_SNAPSHOT_MAX_AGE,
+            )
+        return response
+
+
+class RecipeViewSet(ConditionalGetMixin, ModelViewSet):
     """Viewset for Recipe model."""
 
     queryset = Recipe.objects.all()
@@ -52,6 +163,83 @@ class RecipeViewSet(ModelViewSet):
         DjangoFilterBackend,
     ]
 
+    def get_queryset(self):
+        """
+        Safe requests get the read queryset with the author joined and
+        the per-user flags annotated. Tags and ingredients are loaded
+        by the serializer for recipes missing in the cache.
+        """
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.select_related("author").with_user_flags(
+                self.request.user
+            )
+        return Recipe.objects.all()
+
+    @property
+    def paginator(self):
+        """
+        Recipes are paginated by page number unless the client
+        opts in to keyset pagination with the cursor parameter.
+        """
+        if (
+            self.request is not None
+            and RecipeCursorPagination.cursor_query_param
+            in self.request.query_params
+        ):
+            self.pagination_class = RecipeCursorPagination
+        return super().paginator
+
+    def get_list_validators(self):
+        """
+        A page is versioned by the filtered collection's size, latest
+        update and counter totals, or with a cursor by the ids, update
+        times and counters of the page itself, which needs no count.
+        Plus the favorites, cart and follows of an authenticated user.
+        """
+        recipes = self.filter_queryset(Recipe.objects.all())
+        if isinstance(self.paginator, RecipeCursorPagination):
+            page = tuple(
+                self.paginator.window(recipes, self.request).values_list(
+                    "id", "updated_at", "favorites_count", "in_carts_count"
+                )
+            )
+            last_modified = max((row[1] for row in page), default=None)
+            etag_parts = (page,)
+        else:
+            stats = recipes.aggregate(
+                count=Count("id"),
+                last_modified=Max("updated_at"),
+                favorites=Sum("favorites_count"),
+                in_carts=Sum("in_carts_count"),
+            )
+            last_modified = stats.pop("last_modified")
+            etag_parts = (last_modified, *stats.values())
+        if self.request.user.is_authenticated:
+            etag_parts += relations_version(self.request.user)
+        return etag_parts, last_modified
+
+    def get_detail_validators(self):
+        """
+        A recipe is versioned by its update time, counters
+        and per-user flags.
+        Malformed ids have no validators and are left to get_object.
+        """
+        try:
+            recipes = self.get_queryset().filter(pk=self.kwargs["pk"])
+        except (TypeError, ValueError):
+            return None, None
+        state = recipes.values_list(
+            "updated_at",
+            "favorites_count",
+            "in_carts_count",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "author_is_subscribed",
+        ).first()
+        if state is None:
+            return None, None
+        return state, state[0]
+
     def get_serializer_class(self):
         """Selects a serializor depending on the request."""
         if self.request.method in SAFE_METHODS:
@@ -59,35 +247,70 @@ class RecipeViewSet(ModelViewSet):
         return CreateRecipeSerializer
 
     @staticmethod
-    def post_method_for_actions(request, pk, serializer_req):
+    def post_method_for_actions(request, pk, model, error):
         """For post requests to shopping_cart and favorite."""
         recipe = get_object_or_404(Recipe, pk=pk)
-        data = {"user": request.user.id, "recipe": pk}
-        serializer = serializer_req(data=data, context={"request": request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if not add_relation(model, request.user.id, "recipe", pk):
+            return Response(
+                {"errors": error}, status=status.HTTP_400_BAD_REQUEST
+            )
         serializer_data = ShortRecipeSerializer(recipe)
         return Response(serializer_data.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
     def delete_method_for_actions(request, pk, error, model):
         """For delete requests to shopping_cart and favorite."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        obj = model.objects.filter(user=request.user, recipe=recipe)
-        if obj.exists():
-            obj.delete()
+        if remove_relation(model, request.user.id, "recipe", pk):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe.objects.only("id"), pk=pk)
         return Response(
             {"errors": f"The recipe has already been removed from {error}"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @staticmethod
+    def bulk_method_for_actions(request, model):
+        """
+        For bulk requests to shopping_cart and favorite:
+        adds or removes all recipes of the request with one statement
+        and reports the result for every recipe.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data["recipes"]))
+        found = set(
+            Recipe.objects.filter(pk__in=ids).values_list("id", flat=True)
+        )
+        targets = [pk for pk in ids if pk in found]
+        if request.method == "POST":
+            done = add_relations(model, request.user.id, "recipe", targets)
+            outcomes = ("added", "already_added")
+        else:
+            done = remove_relations(
+                model, request.user.id, "recipe", targets
+            )
+            outcomes = ("removed", "not_added")
+        done = set(done)
+        results = [
+            {
+                "id": pk,
+                "status": (
+                    "not_found" if pk not in found
+                    else outcomes[0] if pk in done
+                    else outcomes[1]
+                ),
+            }
+            for pk in ids
+        ]
+        return Response({"results": results})
+
     @action(methods=["post", "delete"], detail=True)
     def favorite(self, request, pk):
         """Method for adding and removing a recipe in favorite."""
         if request.method == "POST":
             return self.post_method_for_actions(
-                request, pk, FavoriteSerializer
+                request, pk, Favorite,
+                "You have already bookmarked this recipe.",
             )
         return self.delete_method_for_actions(
             request, pk, "favorite", Favorite
@@ -101,26 +324,95 @@ class RecipeViewSet(ModelViewSet):
         """Method for adding and removing a recipe in shopping_cart."""
         if request.method == "POST":
             return self.post_method_for_actions(
-                request, pk, ShoppingCartSerializer
+                request, pk, ShoppingCart,
+                "You have already added this recipe to shopping list",
             )
         return self.delete_method_for_actions(
             request, pk, "shopping cart", ShoppingCart
         )
 
     @action(
-        detail=False, methods=["get"], permission_classes=(IsAuthenticated,)
+        methods=["post", "delete"],
+        detail=False,
+        url_path="favorite",
+        url_name="favorite-bulk",
+    )
+    def favorite_bulk(self, request):
+        """Adds or removes a list of recipes in favorite."""
+        return self.bulk_method_for_actions(request, Favorite)
+
+    @action(
+        methods=["post", "delete"],
+        detail=False,
+        url_path="shopping_cart",
+        url_name="shopping-cart-bulk",
+    )
+    def shopping_cart_bulk(self, request):
+        """Adds or removes a list of recipes in shopping_cart."""
+        return self.bulk_method_for_actions(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PDFRenderer, PlainTextRenderer, CSVRenderer, JSONRenderer
+        ),
     )
     def download_shopping_cart(self, request):
-        """Allows the current user to download the shopping list."""
-        shopping_cart = (
-            IngredientInRecipe.objects.filter(
-                recipe__shopping_cart__user=request.user
+        """
+        Allows the current user to download the shopping list
+        as pdf (the default), txt, csv or json, chosen by ?format=
+        or the Accept header. Text formats are streamed.
+        With ?async=1 large lists are rendered by the background worker
+        and the response is the job to poll instead.
+        """
+        shopping_cart = ShoppingListItem.objects.shopping_list(request.user)
+        renderer = request.accepted_renderer
+        if renderer.format != PDFRenderer.format:
+            response = StreamingHttpResponse(
+                renderer.stream(
+                    map(shopping_list_row, shopping_cart.iterator())
+                ),
+                content_type=f"{renderer.media_type}; charset=utf-8",
             )
-            .values(
-                "ingredient__name",
-                "ingredient__measurement_unit",
+            response["Content-Disposition"] = (
+                f'attachment; filename="shopping_cart.{renderer.format}"'
             )
-            .order_by("ingredient__name")
-            .annotate(ingredient_amount_sum=Sum("amount"))
+            return response
+        rows = shopping_list_rows(shopping_cart)
+        if (
+            request.query_params.get("async")
+            and len(rows) > settings.SHOPPING_LIST_SYNC_LIMIT
+        ):
+            job = enqueue_pdf_file(request.user, rows)
+            serializer = JobSerializer(job, context={"request": request})
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        return create_pdf_file(request, rows)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated,),
+        url_path=r"download_shopping_cart/(?P<job_id>[0-9]+)",
+    )
+    def shopping_cart_job(self, request, job_id):
+        """Status of a shopping list rendering job of the current user."""
+        job = get_object_or_404(
+            Job, pk=job_id, kind="shopping_list", user=request.user
         )
-        return create_pdf_file(shopping_cart)
+        return Response(
+            JobSerializer(job, context={"request": request}).data
+        )
+
+
+class DatabasePoolView(APIView):
+    """
+    Connection pool counters of the worker process serving the request,
+    for monitoring. Empty unless a pooled database backend is used.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(pool_stats())
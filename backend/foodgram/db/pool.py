@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import DatabaseError
+
+# Connection pools of this process by database alias.
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(DatabaseError):
+    """No pooled connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of raw DB-API connections to one database,
+    shared by the threads of a worker process.
+    Idle connections are checked with a query before they are handed out
+    again if they haven't been used for check_interval seconds,
+    and are closed once they are older than max_lifetime seconds.
+    """
+
+    def __init__(self, max_size, timeout, max_lifetime, check_interval):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.condition = threading.Condition()
+        # Idle connections as (connection, last used) pairs,
+        # most recently used last.
+        self.idle = deque()
+        self.created_at = {}
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    @property
+    def size(self):
+        return len(self.created_at)
+
+    def is_expired(self, connection, now):
+        return now - self.created_at[connection] > self.max_lifetime
+
+    def take_idle(self, now):
+        """
+        Takes the most recently used idle connection, or None.
+        Expired connections are dropped, and connections idle for too
+        long come with a flag asking for a health check.
+        """
+        while self.idle:
+            connection, last_used = self.idle.pop()
+            if self.is_expired(connection, now):
+                self.forget(connection)
+                close_quietly(connection)
+                continue
+            return connection, now - last_used > self.check_interval
+        return None, False
+
+    def forget(self, connection):
+        del self.created_at[connection]
+        self.discarded += 1
+        self.condition.notify()
+
+    def checkout(self, connect, ping):
+        """
+        Hands out an idle connection, opens a new one with connect()
+        while the pool is below max_size, or waits for one to be returned.
+        ping(connection) tells whether a stale idle connection still works.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self.condition:
+                connection, check = self.take_idle(time.monotonic())
+                if connection is None and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    waited = True
+                    if remaining <= 0 or not self.condition.wait(remaining):
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"No database connection became free "
+                            f"within {self.timeout} seconds."
+                        )
+                    continue
+                if connection is None:
+                    # Reserves the slot while the connection is opened.
+                    connection = object()
+                    self.created_at[connection] = time.monotonic()
+                    check = None
+            if check is None:
+                connection = self.open(connection, connect)
+            elif check and not ping(connection):
+                with self.condition:
+                    self.forget(connection)
+                close_quietly(connection)
+                continue
+            self.record_checkout(started, waited)
+            return connection
+
+    def open(self, slot, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                del self.created_at[slot]
+                self.condition.notify()
+            raise
+        with self.condition:
+            del self.created_at[slot]
+            self.created_at[connection] = time.monotonic()
+            self.created += 1
+        return connection
+
+    def record_checkout(self, started, waited):
+        wait = time.monotonic() - started
+        with self.condition:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def checkin(self, connection, usable):
+        """Returns a connection to the pool, or closes it if it is broken."""
+        with self.condition:
+            known = connection in self.created_at
+            if (
+                known and usable
+                and not self.is_expired(connection, time.monotonic())
+            ):
+                self.idle.append((connection, time.monotonic()))
+                self.condition.notify()
+                return
+            if known:
+                self.forget(connection)
+        close_quietly(connection)
+
+    def stats(self):
+        """Pool counters for monitoring; times are in seconds."""
+        with self.condition:
+            now = time.monotonic()
+            ages = [now - created for created in self.created_at.values()]
+            return {
+                "max_size": self.max_size,
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": self.size - len(self.idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_time_total": round(self.wait_time, 6),
+                "wait_time_max": round(self.max_wait, 6),
+                "created": self.created,
+                "discarded": self.discarded,
+                "connection_age_max": round(max(ages, default=0), 3),
+                "connection_age_avg": round(
+                    sum(ages) / len(ages) if ages else 0, 3
+                ),
+            }
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def get_pool(alias, settings_dict):
+    """
+    Pool of the database alias in the current process.
+    A forked worker gets new pools instead of sharing the parent's
+    sockets.
+    """
+    key = (os.getpid(), alias)
+    with pools_lock:
+        if key not in pools:
+            options = settings_dict.get("POOL", {})
+            pools[key] = ConnectionPool(
+                max_size=options.get("MAX_SIZE", 10),
+                timeout=options.get("TIMEOUT", 10),
+                max_lifetime=options.get("MAX_LIFETIME", 60 * 30),
+                check_interval=options.get("CHECK_INTERVAL", 30),
+            )
+        return pools[key]
+
+
+def pool_stats():
+    """Counters of the pools of the current process by database alias."""
+    with pools_lock:
+        current = [
+            (alias, pool) for (pid, alias), pool in pools.items()
+            if pid == os.getpid()
+        ]
+    return {alias: pool.stats() for alias, pool in current}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Makes a database backend take its connections from a ConnectionPool.
+    Django closes a connection at the end of a request when it is older
+    than CONN_MAX_AGE; closing hands it back to the pool instead.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        return self.pool.checkout(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(
+                conn_params
+            ),
+            self.ping,
+        )
+
+    def ping(self, connection):
+        """Health check of an idle raw connection."""
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def reset(self, connection):
+        """
+        Rolls back whatever the connection was doing before it goes
+        back to the pool. Returns whether it can be reused.
+        """
+        try:
+            connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A connection closed inside atomic() is still referenced
+        # by this wrapper until the block exits, so it isn't shared.
+        usable = (
+            not self.in_atomic_block
+            and self.reset(self.connection)
+            and (not self.errors_occurred or self.ping(self.connection))
+        )
+        with self.wrap_database_errors:
+            self.pool.checkin(self.connection, usable)
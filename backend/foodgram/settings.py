@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 from dotenv import load_dotenv
 
@@ -86,6 +87,11 @@ WSGI_APPLICATION = "foodgram.wsgi.application"
 # }
 
 # Database
+# foodgram.db.postgresql and foodgram.db.sqlite3 are the Django backends
+# with a connection pool per worker process. CONN_MAX_AGE keeps a thread's
+# connection across requests, seconds. POOL: maximum number of connections,
+# seconds to wait for a free one, seconds after which a connection is
+# replaced and seconds of idleness after which it is checked before reuse.
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
@@ -93,7 +99,28 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='a'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='a'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', default=0)),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=10)),
+            'MAX_LIFETIME': int(
+                os.getenv('DB_POOL_MAX_LIFETIME', default=60 * 30)
+            ),
+            'CHECK_INTERVAL': int(
+                os.getenv('DB_POOL_CHECK_INTERVAL', default=30)
+            ),
+        },
+    }
+}
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -151,6 +178,25 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 6,
 }
 
+# "token" for database tokens, "signed" for signed access tokens that are
+# checked without database queries, plus refresh tokens
+AUTH_TOKEN_MODE = os.getenv("AUTH_TOKEN_MODE", default="token")
+if AUTH_TOKEN_MODE == "signed":
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"].insert(
+        0, "users.authentication.SignedTokenAuthentication"
+    )
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(
+        minutes=int(os.getenv("ACCESS_TOKEN_MINUTES", default=15))
+    ),
+    "REFRESH_TOKEN_LIFETIME": timedelta(
+        days=int(os.getenv("REFRESH_TOKEN_DAYS", default=14))
+    ),
+    "AUTH_HEADER_TYPES": ("Token", "Bearer"),
+    "UPDATE_LAST_LOGIN": False,
+}
+
 
 DJOSER = {
     "HIDE_USERS": False,
@@ -179,3 +225,52 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 # Data files
 DATA_FILES_DIR = os.path.join(BASE_DIR, "data")
 FONTS_FILES_DIR = os.path.join(DATA_FILES_DIR, "HelveticaRegular.ttf")
+
+# Lifetime of the cached shared part of recipe representations, seconds
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long a process may serve its copy of the tags after they changed
+# elsewhere, seconds. Changes are seen at once with a shared cache
+TAG_CATALOGUE_TTL = 60
+
+# Ingredient autocomplete: maximum number of results
+# and how often the popularity ranking is refreshed, seconds
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_RANKING_TTL = 60 * 10
+
+# Ingredient catalogue snapshot: lifetime in client caches, seconds,
+# and an optional directory to also write it to as a static file
+INGREDIENT_SNAPSHOT_MAX_AGE = 60 * 60 * 24
+INGREDIENT_SNAPSHOT_DIR = os.getenv("INGREDIENT_SNAPSHOT_DIR")
+
+# Lifetime of rendered shopping list PDFs in the cache, seconds
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Larger shopping lists can be rendered by the background worker
+# when the client asks for ?async=1
+SHOPPING_LIST_SYNC_LIMIT = 300
+
+# How often an idle run_worker process polls for queued jobs, seconds
+WORKER_POLL_INTERVAL = 1
+
+# Running jobs without a heartbeat for this many seconds are queued again,
+# up to the maximum number of attempts
+JOB_HEARTBEAT_TIMEOUT = 60 * 10
+JOB_MAX_ATTEMPTS = 3
+
+# Recipe images: maximum decoded size in bytes, maximum number of pixels,
+# allowed Pillow formats and the size kept in memory while decoding
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 4096 * 4096
+RECIPE_IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+RECIPE_IMAGE_SPOOL_SIZE = 1024 * 1024
+
+# Resized copies of recipe images generated by the background worker:
+# variant name and the box the image is fitted into, pixels
+RECIPE_IMAGE_VARIANTS = {
+    "thumbnail": (320, 320),
+    "medium": (800, 800),
+}
+
+# Maximum number of recipes in one bulk favorite or shopping cart request
+BULK_RELATIONS_LIMIT = 100
@@ -42,7 +42,7 @@ class RecipeAdmin(admin.ModelAdmin):
         "pk",
         "name",
         "author",
-        "favorite_count",
+        "favorites_count",
     )
     search_fields = (
         "author",
@@ -57,10 +57,6 @@ class RecipeAdmin(admin.ModelAdmin):
         IngredientRecipeInline,
     ]
 
-    def favorite_count(self, obj):
-        """Displays the total number of favorites for this recipe."""
-        return obj.favorit_recipe.count()
-
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
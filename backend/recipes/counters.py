@@ -0,0 +1,193 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import Follow, User
+from users.relations import relations_changed
+
+from .models import Favorite, Recipe, ShoppingCart
+
+
+def change_counter(queryset, field, delta, **changes):
+    """Adds delta to a counter of the matching rows in one UPDATE."""
+    queryset.update(
+        **{field: Greatest(F(field) + delta, Value(0))}, **changes
+    )
+
+
+def change_recipe_counter(recipe_ids, field, delta):
+    """
+    Leaves updated_at alone: counters are filled into the cached
+    recipe representation on every read.
+    """
+    change_counter(Recipe.objects.filter(pk__in=recipe_ids), field, delta)
+
+
+def change_user_counter(user_ids, field, delta):
+    change_counter(User.objects.filter(pk__in=user_ids), field, delta)
+
+
+def count_of(model, field):
+    """Number of model rows pointing at the outer row through field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+# Counter fields and the expressions that compute them from scratch.
+RECIPE_COUNTERS = {
+    "favorites_count": lambda: count_of(Favorite, "recipe"),
+    "in_carts_count": lambda: count_of(ShoppingCart, "recipe"),
+}
+USER_COUNTERS = {
+    "recipes_count": lambda: count_of(Recipe, "author"),
+    "followers_count": lambda: count_of(Follow, "following"),
+    "following_count": lambda: count_of(Follow, "user"),
+}
+
+
+def reconcile(model, counters, **changes):
+    """
+    Recomputes drifted counters of the model, applying changes
+    to the fixed rows as well.
+    Returns the number of rows fixed per counter.
+    """
+    fixed = {}
+    for field, expression in counters.items():
+        drifted = model.objects.annotate(actual=expression()).exclude(
+            **{field: F("actual")}
+        )
+        fixed[field] = model.objects.filter(
+            pk__in=drifted.values("pk")
+        ).update(**{field: expression()}, **changes)
+    return fixed
+
+
+# Foreign keys of the relation rows the counters are kept for.
+RELATION_FIELDS = {
+    Favorite: ("user_id", "recipe_id"),
+    ShoppingCart: ("user_id", "recipe_id"),
+    Follow: ("user_id", "following_id"),
+}
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=Follow)
+def remember_stored_relation(sender, instance, **kwargs):
+    """
+    Keeps the stored foreign keys of an edited row for post_save.
+    Also used by recipes.shopping_list.
+    """
+    instance.stored_relation = None
+    if instance.pk is not None:
+        instance.stored_relation = (
+            sender.objects.filter(pk=instance.pk)
+            .values(*RELATION_FIELDS[sender])
+            .first()
+        )
+
+
+def moved_from(instance):
+    """
+    The stored foreign keys of a saved row that was reassigned
+    to another user or object, None if it wasn't.
+    """
+    stored = getattr(instance, "stored_relation", None)
+    if stored is None or all(
+        getattr(instance, field) == value for field, value in stored.items()
+    ):
+        return None
+    return stored
+
+
+def count_saved(instance, created, field, change, counter):
+    """
+    Counts a new row, or moves the count of a row reassigned through
+    field. Saving a row again without changes keeps the counter.
+    """
+    if not created:
+        stored = moved_from(instance)
+        if stored is None or stored[field] == getattr(instance, field):
+            return
+        change([stored[field]], counter, -1)
+    change([getattr(instance, field)], counter, 1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_saved(sender, instance, created, **kwargs):
+    count_saved(
+        instance, created, "recipe_id", change_recipe_counter,
+        "favorites_count"
+    )
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_recipe_counter([instance.recipe_id], "favorites_count", -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(sender, instance, created, **kwargs):
+    count_saved(
+        instance, created, "recipe_id", change_recipe_counter,
+        "in_carts_count"
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    change_recipe_counter([instance.recipe_id], "in_carts_count", -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    count_saved(
+        instance, created, "user_id", change_user_counter, "following_count"
+    )
+    count_saved(
+        instance, created, "following_id", change_user_counter,
+        "followers_count"
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_user_counter([instance.user_id], "following_count", -1)
+    change_user_counter([instance.following_id], "followers_count", -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_user_counter([instance.author_id], "recipes_count", 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_user_counter([instance.author_id], "recipes_count", -1)
+
+
+@receiver(relations_changed, sender=Favorite)
+def favorites_changed(sender, user_id, ids, added, **kwargs):
+    change_recipe_counter(ids, "favorites_count", 1 if added else -1)
+
+
+@receiver(relations_changed, sender=ShoppingCart)
+def shopping_carts_changed(sender, user_id, ids, added, **kwargs):
+    change_recipe_counter(ids, "in_carts_count", 1 if added else -1)
+
+
+@receiver(relations_changed, sender=Follow)
+def follows_changed(sender, user_id, ids, added, **kwargs):
+    delta = 1 if added else -1
+    change_user_counter([user_id], "following_count", delta * len(ids))
+    change_user_counter(ids, "followers_count", delta)
@@ -0,0 +1,75 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+from recipes.storage import image_storage
+
+DIRECTORIES = ("recipes/images", "recipes/variants")
+
+
+def walk(storage, directory):
+    """Yields the names of all files under a storage directory."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk(storage, os.path.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes recipe images and image variants "
+        "that no recipe refers to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=60 * 60,
+            help=(
+                "Keep files younger than this many seconds, they may "
+                "belong to a recipe that is being saved. 3600 by default."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the files that would be deleted.",
+        )
+
+    def referenced(self):
+        names = set()
+        for image, variants in Recipe.objects.values_list(
+            "image", "image_variants"
+        ).iterator():
+            names.add(image)
+            names.update(variants.values())
+        return names
+
+    def handle(self, *args, **options):
+        # Files are listed before the references are read,
+        # so an image saved in between is never collected.
+        files = [
+            name
+            for directory in DIRECTORIES
+            for name in walk(image_storage, directory)
+        ]
+        referenced = self.referenced()
+        cutoff = timezone.now() - timedelta(seconds=options["grace"])
+        deleted = 0
+        for name in files:
+            if name in referenced:
+                continue
+            if image_storage.get_modified_time(name) > cutoff:
+                continue
+            if not options["dry_run"]:
+                image_storage.delete(name)
+            self.stdout.write(name)
+            deleted += 1
+        self.stdout.write(f"{deleted} unreferenced files")
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.catalogue import ingredient_catalogue
+
+
+class Command(BaseCommand):
+    help = "Writes the ingredient catalogue snapshot as a static file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir",
+            default=settings.INGREDIENT_SNAPSHOT_DIR,
+            help="Target directory, INGREDIENT_SNAPSHOT_DIR by default.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["dir"]:
+            self.stderr.write("No target directory given.", ending='')
+            return
+        catalogue = ingredient_catalogue.get()
+        catalogue.write_snapshot(options["dir"])
+        self.stdout.write(
+            f"snapshot {catalogue.snapshot_version} written", ending=''
+        )
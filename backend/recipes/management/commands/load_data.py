@@ -4,6 +4,7 @@ import os
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
+from api.catalogue import bump_version
 from recipes.models import Ingredient
 
 
@@ -24,6 +25,7 @@ class Command(BaseCommand):
                     for item in data
                 ]
                 Ingredient.objects.bulk_create(ingredients)
+                bump_version("ingredients")
             self.stdout.write("finished", ending='')
 
         except FileNotFoundError:
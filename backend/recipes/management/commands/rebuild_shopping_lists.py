@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.shopping_list import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recomputes shopping lists from the shopping carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help=(
+                "Id of a user whose shopping list is rebuilt, "
+                "may be repeated. All users by default."
+            ),
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        written = rebuild(options["users"])
+        self.stdout.write(f"{written} shopping list items written")
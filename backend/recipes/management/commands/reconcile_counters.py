@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import RECIPE_COUNTERS, USER_COUNTERS, reconcile
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Recomputes denormalized counters that drifted from the data."
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        fixed = {
+            "recipe": reconcile(Recipe, RECIPE_COUNTERS),
+            "user": reconcile(User, USER_COUNTERS),
+        }
+        for model_name, counters in fixed.items():
+            for field, rows in counters.items():
+                self.stdout.write(f"{model_name}.{field}: {rows} fixed")
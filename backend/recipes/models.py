@@ -1,9 +1,16 @@
 from colorfield.fields import ColorField
+from django.core.exceptions import EmptyResultSet
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.utils.translation import gettext as _
 
-from users.models import User
+from users.models import Follow, User
+
+from .storage import get_image_storage
 
 
 class Tag(models.Model):
@@ -58,6 +65,76 @@ class Ingredient(models.Model):
         )
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Queries for the recipe read path.
+    """
+
+    @staticmethod
+    def related_lookups():
+        """Prefetch lookups for the tags and ingredients of recipes."""
+        return (
+            "tags",
+            Prefetch(
+                "ingredient_amounts",
+                queryset=IngredientInRecipe.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """
+        Annotates is_favorited, is_in_shopping_cart and author_is_subscribed
+        for the given user as EXISTS subqueries.
+        """
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            author_is_subscribed=Exists(
+                Follow.objects.filter(
+                    user=user, following=OuterRef("author")
+                )
+            ),
+        )
+
+    def latest_per_author(self, limit):
+        """
+        Keeps the limit latest recipes of every author, ranked with
+        ROW_NUMBER() OVER (PARTITION BY author_id) in a single query.
+        """
+        ranked = self.order_by().annotate(
+            author_rank=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("pub_date").desc(), F("id").desc()),
+            )
+        ).values("id", "author_rank")
+        # Window results can't be filtered on directly, so the ranked
+        # query is wrapped in a subquery.
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            return self.none()
+        return self.filter(
+            pk__in=RawSQL(
+                f"SELECT ranked.id FROM ({sql}) ranked "
+                "WHERE ranked.author_rank <= %s",
+                (*params, limit),
+            )
+        )
+
+
 class Recipe(models.Model):
     """
     The base Recipe model.
@@ -86,13 +163,29 @@ class Recipe(models.Model):
         ],
     )
     image = models.ImageField(
-        upload_to="recipes/images/", null=True, default=None
+        upload_to="recipes/images/",
+        storage=get_image_storage,
+        null=True,
+        default=None,
+    )
+    image_variants = models.JSONField(
+        "Resized copies of the image", default=dict, blank=True,
+        editable=False
     )
     ingredients = models.ManyToManyField(
         "Ingredient", verbose_name="Ingredient", through="IngredientInRecipe"
     )
     tags = models.ManyToManyField("Tag", verbose_name="Tag")
     pub_date = models.DateTimeField("Publication date", auto_now_add=True)
+    updated_at = models.DateTimeField("Last update", auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        "Times added to favorites", default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        "Times added to shopping lists", default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -101,6 +194,15 @@ class Recipe(models.Model):
         verbose_name = "Recipe"
         verbose_name_plural = "Recipes"
         ordering = ["-pub_date"]
+        indexes = (
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+        )
 
 
 class IngredientInRecipe(models.Model):
@@ -134,6 +236,69 @@ class IngredientInRecipe(models.Model):
                 name="unique_ingredient_recipe"
             ),
         )
+        indexes = (
+            models.Index(
+                fields=["recipe"],
+                include=["ingredient", "amount"],
+                name="ingredient_recipe_cover_idx",
+            ),
+        )
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """
+    Queries for the materialized shopping lists.
+    """
+
+    def shopping_list(self, user):
+        """
+        The shopping list of the user: ingredient name, measurement unit
+        and ingredient_amount_sum, by ingredient name.
+        """
+        return (
+            self.filter(user=user)
+            .values(
+                "ingredient__name",
+                "ingredient__measurement_unit",
+            )
+            .order_by("ingredient__name")
+            .annotate(ingredient_amount_sum=F("total_amount"))
+        )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Total amount of an ingredient over the recipes
+    in the user's shopping cart.
+    Maintained by recipes.shopping_list.
+    """
+
+    user = models.ForeignKey(
+        User, related_name="shopping_list", on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, related_name="shopping_list_items",
+        on_delete=models.CASCADE
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name=_("Total amount"), default=0
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    def __str__(self) -> str:
+        return f"{self.total_amount} of {self.ingredient} for {self.user}"
+
+    class Meta:
+        verbose_name = _("Shopping list item")
+        verbose_name_plural = _("Shopping list items")
+        ordering = ("id",)
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_user_ingredient"
+            ),
+        )
 
 
 class Favorite(models.Model):
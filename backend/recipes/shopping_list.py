@@ -0,0 +1,163 @@
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.relations import relations_changed
+
+from .counters import moved_from
+from .models import IngredientInRecipe, ShoppingCart, ShoppingListItem
+
+
+def recipe_amounts(*recipe_ids):
+    """Total amounts of the recipes ingredients by ingredient id."""
+    return dict(
+        IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .values_list("ingredient_id")
+        .order_by()
+        .annotate(Sum("amount"))
+    )
+
+
+def holders(recipe_id):
+    """Ids of the users having the recipe in their shopping cart."""
+    return list(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def apply_amounts(user_ids, amounts, sign):
+    """
+    Adds (sign 1) or subtracts (sign -1) amounts, by ingredient id,
+    to the shopping lists of the users with a single UPDATE.
+    Items that drop to zero are removed.
+    """
+    if not user_ids or not amounts:
+        return
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=amounts
+    )
+    if sign > 0:
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id in amounts
+            ],
+            ignore_conflicts=True,
+        )
+    delta = Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(sign * amount))
+            for ingredient_id, amount in amounts.items()
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    items.update(total_amount=Greatest(F("total_amount") + delta, Value(0)))
+    if sign < 0:
+        items.filter(total_amount=0).delete()
+
+
+def propagate_amounts(recipe_id, deltas):
+    """
+    Propagates amount changes of recipe ingredients made without model
+    signals, e.g. by bulk_create or bulk_update, to the carts holding it.
+    """
+    if deltas:
+        apply_amounts(holders(recipe_id), deltas, 1)
+
+
+def rebuild(user_ids=None):
+    """
+    Recomputes the shopping lists of the users, or of everybody,
+    from their shopping carts.
+    """
+    items = ShoppingListItem.objects.all()
+    carts = {"recipe__shopping_cart__isnull": False}
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        carts = {"recipe__shopping_cart__user_id__in": user_ids}
+    # One filter() call, as a second one on the multi-valued relation
+    # would join the carts again and multiply the sums.
+    carts = IngredientInRecipe.objects.filter(**carts)
+    items.delete()
+    totals = (
+        carts.values("recipe__shopping_cart__user_id", "ingredient_id")
+        .order_by()
+        .annotate(total_amount=Sum("amount"))
+    )
+    return len(
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=total["recipe__shopping_cart__user_id"],
+                    ingredient_id=total["ingredient_id"],
+                    total_amount=total["total_amount"],
+                )
+                for total in totals.iterator()
+            ),
+            batch_size=1000,
+        )
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added_to_cart(sender, instance, created, **kwargs):
+    """
+    Adds the recipe to the shopping list. A cart row reassigned
+    to another user or recipe is taken out of the stored one first.
+    """
+    if not created:
+        stored = moved_from(instance)
+        if stored is None:
+            return
+        apply_amounts(
+            [stored["user_id"]], recipe_amounts(stored["recipe_id"]), -1
+        )
+    apply_amounts([instance.user_id], recipe_amounts(instance.recipe_id), 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_removed_from_cart(sender, instance, **kwargs):
+    apply_amounts([instance.user_id], recipe_amounts(instance.recipe_id), -1)
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_ingredient_amount(sender, instance, **kwargs):
+    """Keeps the stored amount of an edited row for post_save."""
+    instance.stored_amount = None
+    if instance.pk is not None:
+        instance.stored_amount = (
+            IngredientInRecipe.objects.filter(pk=instance.pk)
+            .values_list("recipe_id", "ingredient_id", "amount")
+            .first()
+        )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def ingredient_amount_saved(sender, instance, **kwargs):
+    if getattr(instance, "stored_amount", None) is not None:
+        recipe_id, ingredient_id, amount = instance.stored_amount
+        apply_amounts(holders(recipe_id), {ingredient_id: amount}, -1)
+    apply_amounts(
+        holders(instance.recipe_id),
+        {instance.ingredient_id: instance.amount},
+        1,
+    )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def ingredient_amount_deleted(sender, instance, **kwargs):
+    apply_amounts(
+        holders(instance.recipe_id),
+        {instance.ingredient_id: instance.amount},
+        -1,
+    )
+
+
+@receiver(relations_changed, sender=ShoppingCart)
+def shopping_cart_changed(sender, user_id, ids, added, **kwargs):
+    apply_amounts([user_id], recipe_amounts(*ids), 1 if added else -1)
@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Names files by the sha256 of their content,
+    e.g. recipes/images/ab/cd/abcd....png, sharded by hash prefix.
+    A file that is already stored is not written again,
+    only its modification time is refreshed.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(
+            directory, digest[:2], digest[2:4], f"{digest}{extension}"
+        )
+        if self.exists(name):
+            # collect_images keeps recently modified files, so reusing
+            # an unreferenced file protects it until it is referenced.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    """Storage of recipe images and their variants."""
+    return image_storage
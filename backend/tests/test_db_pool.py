@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.db import connections, transaction
+from django.test import SimpleTestCase
+
+from foodgram.db import pool
+from foodgram.db.pool import PoolTimeout
+from foodgram.db.sqlite3.base import DatabaseWrapper
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """The pooled SQLite backend on a database file of its own."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, "pool.sqlite3")
+        self.alias = f"pool-{self.id()}"
+        self.addCleanup(self.close_pool)
+
+    def close_pool(self):
+        key = (os.getpid(), self.alias)
+        test_pool = pool.pools.pop(key, None)
+        if test_pool is not None:
+            for connection, _ in test_pool.idle:
+                connection.close()
+
+    def wrapper(self, **options):
+        return DatabaseWrapper(
+            {
+                "ENGINE": "foodgram.db.sqlite3",
+                "NAME": self.name,
+                "USER": "",
+                "PASSWORD": "",
+                "HOST": "",
+                "PORT": "",
+                "OPTIONS": {},
+                "TIME_ZONE": None,
+                "AUTOCOMMIT": True,
+                "ATOMIC_REQUESTS": False,
+                "CONN_MAX_AGE": 0,
+                "POOL": options,
+            },
+            self.alias,
+        )
+
+    def stats(self):
+        return pool.pool_stats()[self.alias]
+
+    def test_closed_connection_is_reused(self):
+        database = self.wrapper()
+        database.ensure_connection()
+        connection = database.connection
+        database.close()
+        database.ensure_connection()
+        self.assertIs(database.connection, connection)
+        stats = self.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["in_use"], 1)
+        database.close()
+        self.assertEqual(self.stats()["idle"], 1)
+
+    def test_checkout_times_out_when_pool_is_exhausted(self):
+        holder = self.wrapper(MAX_SIZE=1, TIMEOUT=0.1)
+        holder.ensure_connection()
+        with self.assertRaises(PoolTimeout):
+            self.wrapper(MAX_SIZE=1, TIMEOUT=0.1).ensure_connection()
+        stats = self.stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["size"], 1)
+        holder.close()
+
+    def test_checkout_waits_for_a_returned_connection(self):
+        holder = self.wrapper(MAX_SIZE=1, TIMEOUT=5)
+        holder.ensure_connection()
+        connection = holder.connection
+        received = []
+
+        def check_out():
+            waiter = self.wrapper(MAX_SIZE=1, TIMEOUT=5)
+            waiter.ensure_connection()
+            received.append(waiter.connection)
+            waiter.close()
+
+        thread = threading.Thread(target=check_out)
+        thread.start()
+        time.sleep(0.1)
+        holder.close()
+        thread.join()
+        self.assertEqual(received, [connection])
+        stats = self.stats()
+        self.assertEqual(stats["waits"], 1)
+        self.assertGreater(stats["wait_time_max"], 0)
+        self.assertEqual(stats["created"], 1)
+
+    def test_broken_idle_connection_is_replaced(self):
+        database = self.wrapper(CHECK_INTERVAL=0)
+        database.ensure_connection()
+        broken = database.connection
+        database.close()
+        broken.close()
+        database.ensure_connection()
+        self.assertIsNot(database.connection, broken)
+        with database.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        stats = self.stats()
+        self.assertEqual(stats["discarded"], 1)
+        self.assertEqual(stats["size"], 1)
+        database.close()
+
+    def test_expired_connection_is_replaced(self):
+        database = self.wrapper(MAX_LIFETIME=0)
+        database.ensure_connection()
+        expired = database.connection
+        database.close()
+        database.ensure_connection()
+        self.assertIsNot(database.connection, expired)
+        database.close()
+
+    def test_connection_closed_inside_atomic_is_not_shared(self):
+        database = self.wrapper()
+        connections[self.alias] = database
+        self.addCleanup(connections.__delitem__, self.alias)
+        with transaction.atomic(using=self.alias):
+            connection = database.connection
+            database.close()
+            self.assertIs(database.connection, connection)
+            self.assertEqual(self.stats()["idle"], 0)
+        self.assertIsNone(database.connection)
+        stats = self.stats()
+        self.assertEqual(stats["size"], 0)
+        self.assertEqual(stats["discarded"], 1)
+        database.ensure_connection()
+        self.assertIsNot(database.connection, connection)
+        database.close()
@@ -0,0 +1,109 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from users.models import User
+
+
+class RecipeFilterTests(TestCase):
+    """
+    Recipe list filters on a dataset where a wrong match shows:
+    authors 1 and 10, a recipe with several tags,
+    and favorites and cart entries of other users.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create_user(
+            pk=1, username="first", email="first@example.com",
+            password="pass",
+        )
+        cls.tenth = User.objects.create_user(
+            pk=10, username="tenth", email="tenth@example.com",
+            password="pass",
+        )
+        cls.breakfast = Tag.objects.create(name="Breakfast", slug="breakfast")
+        cls.lunch = Tag.objects.create(name="Lunch", slug="lunch")
+        cls.dinner = Tag.objects.create(name="Dinner", slug="dinner")
+        cls.first_recipe = Recipe.objects.create(
+            name="Porridge", author=cls.first, cooking_time=10
+        )
+        cls.first_recipe.tags.set([cls.breakfast, cls.lunch, cls.dinner])
+        cls.tenth_recipes = [
+            Recipe.objects.create(
+                name=f"Soup {number}", author=cls.tenth, cooking_time=30
+            )
+            for number in range(10)
+        ]
+        for recipe in cls.tenth_recipes[:3]:
+            recipe.tags.set([cls.lunch])
+        Favorite.objects.create(user=cls.first, recipe=cls.tenth_recipes[0])
+        Favorite.objects.create(user=cls.tenth, recipe=cls.tenth_recipes[1])
+        ShoppingCart.objects.create(
+            user=cls.first, recipe=cls.tenth_recipes[2]
+        )
+        ShoppingCart.objects.create(
+            user=cls.tenth, recipe=cls.tenth_recipes[3]
+        )
+
+    def setUp(self):
+        # Catalogue versions are bumped on commit, which never happens
+        # inside a test case.
+        cache.clear()
+        self.client = APIClient()
+
+    def get_ids(self, query, user=None):
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            f"/api/recipes/?cursor=&limit=100&{query}"
+        )
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe["id"] for recipe in response.json()["results"]]
+        self.assertEqual(len(ids), len(set(ids)))
+        return ids
+
+    def test_author_is_matched_exactly(self):
+        self.assertEqual(self.get_ids("author=1"), [self.first_recipe.id])
+        self.assertCountEqual(
+            self.get_ids("author=10"),
+            [recipe.id for recipe in self.tenth_recipes],
+        )
+
+    def test_recipe_with_several_tags_is_listed_once(self):
+        ids = self.get_ids("tags=breakfast&tags=lunch&tags=dinner")
+        self.assertCountEqual(
+            ids,
+            [self.first_recipe.id]
+            + [recipe.id for recipe in self.tenth_recipes[:3]],
+        )
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.get("/api/recipes/?tags=brunch")
+        self.assertEqual(response.status_code, 400)
+
+    def test_favorites_of_the_user_only(self):
+        self.assertEqual(
+            self.get_ids("is_favorited=1", self.first),
+            [self.tenth_recipes[0].id],
+        )
+
+    def test_shopping_cart_of_the_user_only(self):
+        self.assertEqual(
+            self.get_ids("is_in_shopping_cart=1", self.first),
+            [self.tenth_recipes[2].id],
+        )
+
+    def test_user_filters_ignored_for_anonymous_users(self):
+        self.assertEqual(len(self.get_ids("is_favorited=1")), 11)
+
+    def test_filter_queries_use_indexes(self):
+        out = StringIO()
+        call_command("audit_indexes", user=self.first.pk, stdout=out)
+        self.assertIn("recipes by author: ok", out.getvalue())
+        self.assertIn("recipes by tags: ok", out.getvalue())
+        self.assertIn("favorite recipes: ok", out.getvalue())
+        self.assertIn("recipes in shopping cart: ok", out.getvalue())
@@ -0,0 +1,43 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users import relations
+from users.models import User
+
+
+class RelationTogglesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="pass"
+        )
+        cls.recipe = Recipe.objects.create(
+            name="Porridge", author=cls.user, cooking_time=10
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/recipes/{self.recipe.id}/favorite/"
+
+    def assert_toggles(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_toggle(self):
+        self.assert_toggles()
+
+    def test_toggle_without_returning(self):
+        with mock.patch.object(
+            relations, "can_return_rows", return_value=False
+        ):
+            self.assert_toggles()
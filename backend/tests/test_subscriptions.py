@@ -0,0 +1,49 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Follow, User
+
+
+class SubscriptionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="pass"
+        )
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com", password="pass"
+        )
+        for number in range(5):
+            Recipe.objects.create(
+                name=f"Recipe {number}", author=cls.author, cooking_time=5
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_no_subscriptions_with_recipes_limit(self):
+        response = self.client.get(
+            "/api/users/subscriptions/?recipes_limit=3"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_offset_past_the_end_with_recipes_limit(self):
+        Follow.objects.create(user=self.user, following=self.author)
+        response = self.client.get(
+            "/api/users/subscriptions/?recipes_limit=3&offset=10"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_recipes_limit(self):
+        Follow.objects.create(user=self.user, following=self.author)
+        response = self.client.get(
+            "/api/users/subscriptions/?recipes_limit=3"
+        )
+        self.assertEqual(response.status_code, 200)
+        (author,) = response.json()["results"]
+        self.assertEqual(len(author["recipes"]), 3)
+        self.assertEqual(author["recipes_count"], 5)
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+# User fields carried in the tokens; request.user is built from them.
+USER_CLAIMS = (
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+
+
+def signed_tokens_enabled():
+    return settings.AUTH_TOKEN_MODE == "signed"
+
+
+def set_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+
+
+def issue_tokens(request, user):
+    """Returns a new access and refresh token pair for the user."""
+    refresh = RefreshToken.for_user(user)
+    set_user_claims(refresh, user)
+    user_logged_in.send(sender=user.__class__, request=request, user=user)
+    return str(refresh.access_token), str(refresh)
+
+
+def revoke(token):
+    """
+    Revokes an access or refresh token until it expires.
+    The revocation list lives in the cache, in memory unless
+    CACHE_BACKEND points to a shared cache.
+    """
+    timeout = token["exp"] - int(timezone.now().timestamp())
+    if timeout > 0:
+        cache.set(f"revoked-token:{token['jti']}", True, timeout)
+
+
+def is_revoked(token):
+    return cache.get(f"revoked-token:{token['jti']}", False)
+
+
+def refresh_access_token(raw_token):
+    """
+    Returns a new access token for a refresh token,
+    with the claims of the user as currently stored.
+    Raises InvalidToken for missing, invalid, expired or revoked tokens
+    and for users that are inactive or no longer exist.
+    """
+    if not raw_token:
+        raise InvalidToken("No refresh token given")
+    try:
+        refresh = RefreshToken(raw_token)
+    except TokenError as error:
+        raise InvalidToken(error.args[0])
+    if is_revoked(refresh):
+        raise InvalidToken("Token is revoked")
+    # Unlike access tokens, refreshes check the user in the database,
+    # so changed users get current claims and removed ones no tokens.
+    user = User.objects.filter(
+        pk=refresh.get("user_id"), is_active=True
+    ).first()
+    if user is None:
+        raise InvalidToken("User not found or inactive")
+    access = refresh.access_token
+    set_user_claims(access, user)
+    return str(access)
+
+
+class SignedTokenAuthentication(JWTAuthentication):
+    """
+    Authenticates requests by a signed access token without touching
+    the database: the signature and expiry are checked in process
+    and request.user is built from the token claims.
+    Keys that are not signed tokens are left to TokenAuthentication.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None or raw_token.count(b".") != 2:
+            return None
+        token = self.get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken("Token is revoked")
+        return self.get_user(token), token
+
+    def get_user(self, validated_token):
+        """
+        A User whose other fields are deferred: they are loaded
+        only if used, and save() writes only the fields it has loaded.
+        """
+        try:
+            claims = {
+                "id": validated_token["user_id"],
+                **{claim: validated_token[claim] for claim in USER_CLAIMS},
+            }
+        except KeyError:
+            raise InvalidToken("Token contains no user claims")
+        # from_db expects the values in model field order.
+        fields = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in claims
+        ]
+        user = User.from_db(
+            "default", fields, [claims[field] for field in fields]
+        )
+        if not user.is_active:
+            raise InvalidToken("User is inactive")
+        return user
@@ -23,6 +23,9 @@ class User(AbstractUser):
     )
     first_name = models.TextField(max_length=150)
     last_name = models.TextField(max_length=150)
+    recipes_count = models.PositiveIntegerField(default=0, editable=False)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
     REQUIRED_FIELDS = ["email", "first_name", "last_name"]
 
     class Meta:
@@ -58,3 +61,8 @@ class Follow(models.Model):
                 check=~models.Q(following=models.F("user"))
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["user", "following"], name="follow_user_following_idx"
+            ),
+        ]
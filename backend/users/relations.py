@@ -0,0 +1,219 @@
+from django.db import connection, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.dispatch import Signal
+from rest_framework import serializers
+
+from recipes.models import Favorite, ShoppingCart
+
+from .models import Follow, User
+
+
+class RelationSet:
+    """
+    Ids of the objects the current user is related to.
+    Ids are collected first and resolved with a single IN query
+    the first time one of them is looked up.
+    """
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.pending = set()
+        self.checked = set()
+        self.found = set()
+
+    def expect(self, ids):
+        """Registers ids that are going to be looked up."""
+        self.pending.update(set(ids) - self.checked)
+
+    def __contains__(self, pk):
+        if pk not in self.checked:
+            self.pending.add(pk)
+            self.load()
+        return pk in self.found
+
+    def load(self):
+        """Resolves all pending ids with one query."""
+        ids = self.pending - self.checked
+        if ids:
+            self.found.update(
+                self.queryset.filter(
+                    **{f"{self.field}__in": ids}
+                ).values_list(self.field, flat=True)
+            )
+            self.checked.update(ids)
+        self.pending.clear()
+
+
+class UserRelations:
+    """
+    Favorites, shopping cart and follows of the current user,
+    shared by all serializers within one request.
+    """
+
+    def __init__(self, user):
+        self.favorites = RelationSet(
+            Favorite.objects.filter(user=user), "recipe_id"
+        )
+        self.shopping_cart = RelationSet(
+            ShoppingCart.objects.filter(user=user), "recipe_id"
+        )
+        self.following = RelationSet(
+            Follow.objects.filter(user=user), "following_id"
+        )
+
+    @classmethod
+    def from_context(cls, context):
+        """
+        Returns the relations of the request user,
+        or None for anonymous users and requestless serializers.
+        """
+        request = context.get("request")
+        if request is None or request.user.is_anonymous:
+            return None
+        relations = getattr(request, "_user_relations", None)
+        if relations is None:
+            relations = cls(request.user)
+            request._user_relations = relations
+        return relations
+
+
+def relations_version(user):
+    """
+    Changes whenever a favorite, shopping cart entry or follow
+    of the user is added or removed. Read with one query.
+    """
+    stats = {}
+    for name, model in (
+        ("favorites", Favorite), ("cart", ShoppingCart), ("follows", Follow)
+    ):
+        rows = model.objects.filter(user=OuterRef("pk")).order_by().values(
+            "user"
+        )
+        stats[f"{name}_count"] = Subquery(
+            rows.annotate(count=Count("id")).values("count")
+        )
+        stats[f"{name}_last"] = Subquery(
+            rows.annotate(last=Max("id")).values("last")
+        )
+    return (
+        User.objects.filter(pk=user.pk)
+        .annotate(**stats)
+        .values_list(*stats)
+        .first()
+    )
+
+
+# Sent once relations of a user have been added or removed in bulk,
+# with the user_id, the ids of the related objects and whether they
+# were added. Model signals are not sent for these rows.
+relations_changed = Signal()
+
+
+def can_return_rows():
+    """Whether INSERT and DELETE support RETURNING on this database."""
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == "postgresql"
+
+
+def relation_table(model, field):
+    """Quoted table, user column and target column of a relation model."""
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table),
+        quote(model._meta.get_field("user").column),
+        quote(model._meta.get_field(field).column),
+    )
+
+
+def add_relations(model, user_id, field, ids):
+    """
+    Adds favorites, shopping cart entries or follows of a user
+    with one multi-row INSERT, skipping the rows the unique constraint
+    already holds. Returns the ids that were added.
+    """
+    ids = list(dict.fromkeys(map(int, ids)))
+    if not ids:
+        return []
+    table, user_column, target_column = relation_table(model, field)
+    ops = connection.ops
+    sql = (
+        f"{ops.insert_statement(ignore_conflicts=True)} {table} "
+        f"({user_column}, {target_column}) "
+        f"VALUES {', '.join(['(%s, %s)'] * len(ids))}"
+        f"{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}"
+    )
+    params = [value for pk in ids for value in (user_id, pk)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        if can_return_rows():
+            cursor.execute(f"{sql} RETURNING {target_column}", params)
+            added = [row[0] for row in cursor.fetchall()]
+        else:
+            existing = set(
+                model.objects.filter(
+                    user_id=user_id, **{f"{field}__in": ids}
+                ).values_list(field, flat=True)
+            )
+            cursor.execute(sql, params)
+            added = [pk for pk in ids if pk not in existing]
+        if added:
+            relations_changed.send(
+                sender=model, user_id=user_id, ids=added, added=True
+            )
+    return added
+
+
+def remove_relations(model, user_id, field, ids):
+    """
+    Removes favorites, shopping cart entries or follows of a user
+    with one DELETE. Returns the ids that were removed.
+    """
+    ids = list(dict.fromkeys(map(int, ids)))
+    if not ids:
+        return []
+    table, user_column, target_column = relation_table(model, field)
+    sql = (
+        f"DELETE FROM {table} WHERE {user_column} = %s "
+        f"AND {target_column} IN ({', '.join(['%s'] * len(ids))})"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        if can_return_rows():
+            cursor.execute(f"{sql} RETURNING {target_column}", [user_id, *ids])
+            removed = [row[0] for row in cursor.fetchall()]
+        else:
+            removed = list(
+                model.objects.filter(
+                    user_id=user_id, **{f"{field}__in": ids}
+                ).values_list(field, flat=True)
+            )
+            cursor.execute(sql, [user_id, *ids])
+        if removed:
+            relations_changed.send(
+                sender=model, user_id=user_id, ids=removed, added=False
+            )
+    return removed
+
+
+def add_relation(model, user_id, field, pk):
+    """Adds one relation, returns whether it was added."""
+    return bool(add_relations(model, user_id, field, [pk]))
+
+
+def remove_relation(model, user_id, field, pk):
+    """Removes one relation, returns whether it was removed."""
+    return bool(remove_relations(model, user_id, field, [pk]))
+
+
+class RelationsListSerializer(serializers.ListSerializer):
+    """
+    Registers the ids of the whole page with the user relations,
+    so each relation costs at most one query per page.
+    """
+
+    def to_representation(self, data):
+        instances = list(data.all() if hasattr(data, "all") else data)
+        relations = UserRelations.from_context(self.context)
+        if relations is not None:
+            self.child.expect_relations(relations, instances)
+        return super().to_representation(instances)
@@ -1,15 +1,23 @@
-import logging
-
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
-from .models import Follow, User
+from .models import User
+from .relations import RelationsListSerializer, UserRelations
 
 from recipes.models import Recipe
+from recipes.storage import image_storage
 
 
-logger = logging.getLogger(__name__)
+def get_recipes_limit(request):
+    """
+    Parses the recipes_limit query parameter.
+    Missing or invalid values mean no limit.
+    """
+    try:
+        limit = int(request.query_params["recipes_limit"])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
 
 
 class CustomUserSerializer(UserSerializer):
@@ -26,18 +34,21 @@ class CustomUserSerializer(UserSerializer):
             "email", "id", "username", "first_name",
             "last_name", "is_subscribed"
         )
+        list_serializer_class = RelationsListSerializer
+
+    def expect_relations(self, relations, users):
+        """Registers the page users with the follows of the request user."""
+        relations.following.expect(user.id for user in users)
 
     def get_is_subscribed(self, obj):
         """
         Returns a bool True or False for request:
         if the current user subscribed on profile.
         """
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            user=request.user, following=obj
-        ).exists()
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+        relations = UserRelations.from_context(self.context)
+        return relations is not None and obj.id in relations.following
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -52,14 +63,35 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Urls of the resized copies of the recipe image by variant name,
+    empty until the background worker has generated them.
+    """
+
+    def to_representation(self, variants):
+        request = self.context.get("request")
+        urls = {}
+        for name, path in variants.items():
+            if name == "source":
+                continue
+            url = image_storage.url(path)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[name] = url
+        return urls
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """
     Serializer to briefly display recipe details.
     """
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
 class FollowListSerializer(CustomUserSerializer):
@@ -68,7 +100,6 @@ class FollowListSerializer(CustomUserSerializer):
     """
 
     recipes = ShortRecipeSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -82,51 +113,18 @@ class FollowListSerializer(CustomUserSerializer):
             "is_subscribed",
             "recipes",
             "recipes_count",
+            "followers_count",
+            "following_count",
         )
-
-    def get_recipes_count(self, object):
-        """
-        Reports the number of recipes in a get request for subscriptions.
-        """
-        return object.recipes.count()
-
-
-class FollowSerializer(serializers.ModelSerializer):
-    """Response when querying my subscriptions."""
-
-    def validate_following(self, following):
-        """Field validation following."""
-        user = self.context.get("request").user
-        if user == following:
-            raise serializers.ValidationError(
-                "It is impossible to follow yourself"
-            )
-        return following
-
-    class Meta:
-        model = Follow
-        fields = ("user", "following")
-
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=("user", "following"),
-                message="You are already following",
-            )
-        ]
-
-    def to_representation(self, instance):
-        """Serializing data with FollowListSerializer."""
-        return FollowListSerializer(
-            instance.following,
-            context={"request": self.context.get("request")}
-        ).data
+        read_only_fields = (
+            "recipes_count", "followers_count", "following_count"
+        )
+        list_serializer_class = RelationsListSerializer
 
 
 class SubscriptionShowSerializer(CustomUserSerializer):
     """serializer for displaying Subscriptions."""
 
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta:
@@ -140,22 +138,23 @@ class SubscriptionShowSerializer(CustomUserSerializer):
             "is_subscribed",
             "recipes",
             "recipes_count",
+            "followers_count",
+            "following_count",
+        )
+        read_only_fields = (
+            "recipes_count", "followers_count", "following_count"
         )
+        list_serializer_class = RelationsListSerializer
 
     def get_recipes(self, obj):
-        """Get recipes of author."""
-        request = self.context.get("request")
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get("recipes_limit")
-        try:
-            recipes = recipes[: int(recipes_limit)]
-        except TypeError:
-            logger.exception('recipes_limit is not convertible to int')
-
-        return ShortRecipeSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
         """
-        Reports the number of recipes in a get request for subscriptions.
+        Get recipes of author.
+        Uses latest_recipes when the view has loaded them for the page.
         """
-        return obj.recipes.count()
+        recipes = getattr(obj, "latest_recipes", None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context["request"])
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return ShortRecipeSerializer(recipes, many=True).data
@@ -1,3 +1,4 @@
+from django.db.models import BooleanField, Value
 from django.shortcuts import get_object_or_404
 
 from rest_framework import status
@@ -7,17 +8,36 @@ from rest_framework.response import Response
 
 from djoser import utils
 from djoser.conf import settings
-from djoser.views import TokenCreateView, UserViewSet
+from djoser.views import TokenCreateView, TokenDestroyView, UserViewSet
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
+from recipes.models import Recipe
+
+from .authentication import (issue_tokens, refresh_access_token, revoke,
+                             signed_tokens_enabled)
 from .models import Follow, User
-from .serializers import FollowSerializer, SubscriptionShowSerializer
+from .relations import add_relation, remove_relation
+from .serializers import (FollowListSerializer, SubscriptionShowSerializer,
+                          get_recipes_limit)
 
 
 class CustomTokenCreateView(TokenCreateView):
-    """To get a token."""
+    """
+    To get a token.
+    With AUTH_TOKEN_MODE=signed the token is a short-lived signed
+    access token, returned together with a refresh token.
+    """
 
     def _action(self, serializer):
-        super()._action(serializer)
+        if signed_tokens_enabled():
+            access, refresh = issue_tokens(self.request, serializer.user)
+            return Response(
+                data={"auth_token": access, "refresh_token": refresh},
+                status=status.HTTP_201_CREATED,
+            )
         token = utils.login_user(self.request, serializer.user)
         token_serializer_class = settings.SERIALIZERS.token
         return Response(
@@ -26,6 +46,34 @@ class CustomTokenCreateView(TokenCreateView):
         )
 
 
+class CustomTokenDestroyView(TokenDestroyView):
+    """
+    To log out.
+    Signed tokens of the request, and the refresh token if one
+    is posted, are revoked until they expire.
+    """
+
+    def post(self, request):
+        if signed_tokens_enabled() and request.data.get("refresh_token"):
+            try:
+                revoke(RefreshToken(request.data["refresh_token"]))
+            except TokenError:
+                pass
+        if isinstance(request.auth, AccessToken):
+            revoke(request.auth)
+        return super().post(request)
+
+
+class TokenRefreshView(APIView):
+    """To get a new signed access token for a refresh token."""
+
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        access = refresh_access_token(request.data.get("refresh_token"))
+        return Response({"auth_token": access})
+
+
 class UsersViewSet(UserViewSet):
     """Viewset for subscriptions, model Follow."""
 
@@ -33,35 +81,59 @@ class UsersViewSet(UserViewSet):
 
     @action(methods=["get"], detail=False)
     def subscriptions(self, request):
-        """Returns the authors the user is following."""
-        authors = User.objects.filter(following__user=request.user)
+        """
+        Returns the authors the user is following.
+        Recipes of the whole page are loaded with one query.
+        """
+        authors = User.objects.filter(following__user=request.user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
         result_pages = self.paginate_queryset(queryset=authors)
+        self.attach_latest_recipes(result_pages, get_recipes_limit(request))
         serializer = SubscriptionShowSerializer(
             result_pages, context={"request": request}, many=True
         )
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def attach_latest_recipes(authors, limit):
+        """Sets latest_recipes of every author, newest first."""
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit is not None:
+            recipes = recipes.latest_per_author(limit)
+        by_author = {author.id: [] for author in authors}
+        for recipe in recipes.only(
+            "id", "name", "image", "image_variants", "cooking_time",
+            "author_id", "pub_date",
+        ).order_by("author_id", "-pub_date", "-id"):
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = by_author[author.id]
+
     @action(methods=["post", "delete"], detail=True)
     def subscribe(self, request, id):
         """Allows you to add or remove authors from subscriptions."""
         if request.method != "POST":
-            subscription = Follow.objects.filter(
-                user=request.user, following=get_object_or_404(User, id=id)
-            )
-            if subscription.exists():
-                self.perform_destroy(subscription)
+            if remove_relation(Follow, request.user.id, "following", id):
                 return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(User.objects.only("id"), id=id)
             return Response(
                 {"errors": "You already unsubscribed or not been subscribed"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        serializer = FollowSerializer(
-            data={
-                "user": request.user.id,
-                "following": get_object_or_404(User, id=id).id,
-            },
-            context={"request": request},
+        following = get_object_or_404(User, id=id)
+        if following == request.user:
+            error = "It is impossible to follow yourself"
+        elif not add_relation(
+            Follow, request.user.id, "following", following.id
+        ):
+            error = "You are already following"
+        else:
+            following.followers_count += 1
+            serializer = FollowListSerializer(
+                following, context={"request": request}
+            )
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            {"errors": error}, status=status.HTTP_400_BAD_REQUEST
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)